@@ -0,0 +1,199 @@
+from board import adjacent, get_column, get_row
+
+# operations after parsing: 1 opens a cell, 2 flags it, 4 chords on it, 3 is the second press of a chord, -1 is a broken chord
+OPEN, FLAG, CHORD_PRESS, CHORD = 1, 2, 3, 4
+INVALID = -1
+
+def iter_tokens(chunks, separator=','):
+    # joins chunks of a replay text (e.g. a file read piece by piece) and yields one action string at a time
+    rest = ''
+    for chunk in chunks:
+        tokens = (rest + chunk).split(separator)
+        rest = tokens.pop()
+        for token in tokens:
+            if token.strip():
+                yield token.strip()
+    if rest.strip():
+        yield rest.strip()
+
+def parse_actions(action_detail):
+    # streaming version of board.get_action, keeps at most three actions in memory and yields the same lists
+    window = []
+    for each_action in action_detail:
+        operation, row, column, current_time = each_action.split(':')
+        window.append([int(operation), int(row), int(column), int(current_time)])
+        if len(window) < 3:
+            continue
+        first, second, third = window
+        if first[0] == FLAG and second[0] == CHORD_PRESS:
+            if third[0] == OPEN and second[1] == third[1] and second[2] == third[2] and first[1] == third[1] and first[2] == third[2]:
+                # this indicates the action is valid
+                third[0] = CHORD
+                yield first
+                yield second
+                yield third
+                window = []
+            else:
+                # this indicates the action is invalid
+                first[0] = INVALID
+                second[0] = INVALID
+                yield first
+                yield second
+                window = [third]
+        else:
+            yield first
+            window = [second, third]
+    yield from window
+
+class ActionAnalyzer(object):
+    def __init__(self, board):
+        self.__board = board
+        self.__rows = get_row(board)
+        self.__cols = get_column(board)
+        self.__revealed = [[False for col in range(0, self.__cols)] for row in range(0, self.__rows)]
+        self.__flagged = [[False for col in range(0, self.__cols)] for row in range(0, self.__rows)]
+        self.__opening_of, self.__opening_cells = self.__label_openings()
+        self.__isolated = self.__label_isolated()
+        self.__solved_openings = set()
+        self.__pending_flag = None
+        self.bv = len(self.__opening_cells) + sum(sum(row) for row in self.__isolated)
+        self.solved_bv = 0
+        self.clicks = 0
+        self.effective_clicks = 0
+        self.last_time = 0
+        self.lost = False
+        self.timeline = [] # (time in ms, solved bv) each time the solved bv changes
+
+    def __label_openings(self):
+        # every opening is its zeros plus the numbers around them, as revealed by one click on any of the zeros
+        opening_of = [[-1 for col in range(0, self.__cols)] for row in range(0, self.__rows)]
+        opening_cells = []
+        for row in range(0, self.__rows):
+            for col in range(0, self.__cols):
+                if self.__board[row][col] != '0' or opening_of[row][col] >= 0:
+                    continue
+                opening = len(opening_cells)
+                cells = set()
+                opening_of[row][col] = opening
+                stack = [(row, col)]
+                while len(stack) > 0:
+                    cur_row, cur_col = stack.pop()
+                    cells.add((cur_row, cur_col))
+                    for ready_row, ready_col in adjacent(cur_row, cur_col):
+                        if 0 <= ready_row < self.__rows and 0 <= ready_col < self.__cols:
+                            cells.add((ready_row, ready_col))
+                            if self.__board[ready_row][ready_col] == '0' and opening_of[ready_row][ready_col] < 0:
+                                opening_of[ready_row][ready_col] = opening
+                                stack.append((ready_row, ready_col))
+                opening_cells.append(cells)
+        return opening_of, opening_cells
+
+    def __label_isolated(self):
+        isolated = [[self.__board[row][col] not in '09' for col in range(0, self.__cols)] for row in range(0, self.__rows)]
+        for cells in self.__opening_cells:
+            for row, col in cells:
+                isolated[row][col] = False
+        return isolated
+
+    def __reveal(self, row, col):
+        # returns the number of newly revealed cells
+        if self.__revealed[row][col] or self.__flagged[row][col]:
+            return 0
+        if self.__board[row][col] == '9':
+            self.lost = True
+            return 0
+        if self.__board[row][col] != '0':
+            self.__revealed[row][col] = True
+            if self.__isolated[row][col]:
+                self.solved_bv += 1
+            return 1
+        revealed = 0
+        pending = [self.__opening_of[row][col]]
+        while len(pending) > 0:
+            opening = pending.pop()
+            if opening in self.__solved_openings:
+                continue
+            self.__solved_openings.add(opening)
+            self.solved_bv += 1
+            for cur_row, cur_col in self.__opening_cells[opening]:
+                if self.__revealed[cur_row][cur_col] or self.__flagged[cur_row][cur_col]:
+                    continue
+                self.__revealed[cur_row][cur_col] = True
+                revealed += 1
+                if self.__board[cur_row][cur_col] == '0':
+                    pending.append(self.__opening_of[cur_row][cur_col])
+        return revealed
+
+    def __chord(self, row, col):
+        if not self.__revealed[row][col] or self.__board[row][col] == '0':
+            return 0
+        around = [(ready_row, ready_col) for ready_row, ready_col in adjacent(row, col) if 0 <= ready_row < self.__rows and 0 <= ready_col < self.__cols]
+        if sum(self.__flagged[ready_row][ready_col] for ready_row, ready_col in around) != int(self.__board[row][col]):
+            return 0
+        revealed = 0
+        for ready_row, ready_col in around:
+            revealed += self.__reveal(ready_row, ready_col)
+        return revealed
+
+    def __flag(self, row, col):
+        if self.__revealed[row][col]:
+            return False
+        self.__flagged[row][col] = not self.__flagged[row][col]
+        return self.__flagged[row][col] and self.__board[row][col] == '9'
+
+    def __apply(self, operation, row, col):
+        solved_bv = self.solved_bv
+        self.clicks += 1
+        if operation == OPEN:
+            effective = self.__reveal(row, col) > 0
+        elif operation == CHORD:
+            effective = self.__chord(row, col) > 0
+        else:
+            effective = self.__flag(row, col)
+        if effective:
+            self.effective_clicks += 1
+        if self.solved_bv != solved_bv:
+            self.timeline.append((self.last_time, self.solved_bv))
+
+    def feed(self, action):
+        # takes one parsed action, a flag press directly followed by a chord press belongs to the chord
+        if self.lost:
+            return
+        operation, row, col, current_time = action
+        if self.__pending_flag is not None:
+            pending, self.__pending_flag = self.__pending_flag, None
+            if operation != CHORD_PRESS:
+                self.__apply(FLAG, pending[1], pending[2])
+        if not (0 <= row < self.__rows and 0 <= col < self.__cols):
+            return
+        self.last_time = max(self.last_time, current_time)
+        if operation == FLAG:
+            self.__pending_flag = action
+        elif operation in (OPEN, CHORD):
+            self.__apply(operation, row, col)
+
+    def result(self):
+        if self.__pending_flag is not None and not self.lost:
+            pending, self.__pending_flag = self.__pending_flag, None
+            self.__apply(FLAG, pending[1], pending[2])
+        elapsed = self.last_time / 1000
+        return {
+            'bv': self.bv,
+            'solved_bv': self.solved_bv,
+            'clicks': self.clicks,
+            'effective_clicks': self.effective_clicks,
+            'time': elapsed,
+            'bvs': self.solved_bv / elapsed if elapsed > 0 else 0.0,
+            'ioe': self.solved_bv / self.clicks if self.clicks else 0.0,
+            'throughput': self.solved_bv / self.effective_clicks if self.effective_clicks else 0.0,
+            'lost': self.lost,
+            'timeline': self.timeline,
+        }
+
+def analyze_actions(board, action_detail):
+    analyzer = ActionAnalyzer(board)
+    for action in parse_actions(action_detail):
+        analyzer.feed(action)
+        if analyzer.lost:
+            break
+    return analyzer.result()
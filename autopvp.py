@@ -1,19 +1,48 @@
-from base64 import b64encode
-from board import get_board, get_board_result
-from log import logger
-from ban import ban_list
+from banlist import get_ban_store
+from bitboard import get_cells_result
+from controller import is_rated, update_level
+from difficulty import get_est_bvs, get_est_level
+from frame_cache import get_frame_cache
+from history import GameHistoryWriter, WINNER_BOT, WINNER_OPPONENT, WINNER_OTHER
+from level_memory import get_level_memory
+from log import frame_logger, logger
+from metrics import Histogram
+from quota import get_quota_store
+from offload import get_offloader
+from pacer import GamePacer, cells_schedule, uniform_schedule
+from receiver import ReceivePipeline
+from recorder import FrameRecorder
+from sender import FrameSender, PRIORITY_GAME, PRIORITY_NORMAL
+from stats import LatencyStats
+from wire import WireStats
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 import os
-import math
 import json
 import time
 import aiohttp
 import hashlib
 import traceback
 
+class GameState(object):
+    def __init__(self):
+        self.started_time = 0
+        self.finished_time = 0
+        self.bv = 0
+        self.bvs = 0
+        self.opponent_solved_bv = 1 # This should avoid bugs in calcuation
+        self.difficulty = ''
+        self.size = (0, 0, 0)
+        self.op = 0
+        self.islands = 0
+        self.level = 0
+
+    def played(self):
+        # started_time lies at the end of the preparation, a game that ended before it was never played
+        return self.finished_time > self.started_time
+
 class AutoPVPApp(object):
-    def __init__(self, config):
+    def __init__(self, config, quota=None, bans=None, offloader=None):
         logger.info('Initializing bot, loading account and establishing websocket connection ...')
         self.__uid = str(config.uid)
         self.__token = config.token
@@ -30,15 +59,101 @@ class AutoPVPApp(object):
         self.__RESUMED = True
         self.__AES_enc = AES.new(config.key.encode(), AES.MODE_ECB)
         self.__AES_dec = AES.new(config.key.encode(), AES.MODE_ECB)
-        self.__USER_LIST = {}
+        self.__USER_LIST = quota if quota is not None else get_quota_store(getattr(config, 'quota_path', ''))
+        self.__BAN_LIST = bans if bans is not None else get_ban_store(getattr(config, 'ban_path', 'ban.txt'))
         self.__NORMAL_COUNTS = config.normal_max
         self.__VIP_COUNTS = config.vip_max
+        self.__frame_cache = get_frame_cache(config.key, config.salt)
+        self.__ws = None
+        self.__ws_compress = getattr(config, 'ws_compress', 15)
+        self.__wire = WireStats(getattr(config, 'wire_sample', 16))
+        self.__sender = FrameSender(getattr(config, 'send_queue_size', 256), wire=self.__wire)
+        self.__frame_info = {}
+        self.connections = 0
+        self.__counters = {'frames_sent': 0, 'games_started': 0, 'games_finished': 0, 'wins': 0, 'losses': 0}
+        self.__encrypt_time = Histogram()
+        self.__decrypt_time = Histogram()
+        self.__LEVEL_MEMORY = get_level_memory(getattr(config, 'level_memory_path', ''), getattr(config, 'level_memory_size', 4096))
+        self.__offloader = offloader if offloader is not None else get_offloader(getattr(config, 'offload', ''))
+        self.__history = GameHistoryWriter(config.history_path) if getattr(config, 'history_path', '') else None
+        self.__recorder = FrameRecorder(config.record_path) if getattr(config, 'record_path', '') else None
+        self.__opponent_uid = ''
+        self.__is_gaming = False
+        self.__game = GameState()
+        self.__pacer = GamePacer(self.__send_progress, self.__send_success)
+        self.__pacing = getattr(config, 'pacing', 'plan')
+        self.__lobby_handlers = {
+            'pvp/enter': self.__on_enter,
+            'pvp/room/enter/event': self.__on_room_enter_event,
+            'pvp/room/exit/event': self.__on_room_exit_event,
+            'pvp/user/online': self.__on_user_online,
+            'pvp/room/ready': self.__on_room_ready,
+            'pvp/room/update': self.__on_room_update,
+            'pvp/room/exit': self.__on_room_exit,
+            'pvp/room/message': self.__on_room_message,
+        }
+        self.__game_handlers = {
+            'pvp/minesweeper/info': self.__on_battle_info,
+            'pvp/minesweeper/progress': self.__on_battle_progress,
+            'pvp/minesweeper/win': self.__on_battle_win,
+            'pvp/room/user/exit': self.__on_room_user_exit,
+        }
+        handled_urls = set(self.__lobby_handlers) | set(self.__game_handlers)
+        self.__handler_stats = {url: LatencyStats() for url in handled_urls}
+        self.__receiver = ReceivePipeline(self.aes_decrypt, config.salt, self.__uid, handled_urls, verify_hash=getattr(config, 'verify_hash', True), wire=self.__wire)
+
+    @property
+    def uid(self):
+        return self.__uid
+
+    @property
+    def frame_cache(self):
+        return self.__frame_cache
+
+    @property
+    def counters(self):
+        return self.__counters
+
+    @property
+    def receiver(self):
+        return self.__receiver
+
+    @property
+    def offloader(self):
+        return self.__offloader
 
     def aes_encrypt(self, message):
-        return self.__AES_enc.encrypt(pad(message, AES.block_size)).hex().upper()
+        started = time.perf_counter()
+        encrypted = self.__AES_enc.encrypt(pad(message, AES.block_size)).hex().upper()
+        self.__encrypt_time.observe(time.perf_counter() - started)
+        return encrypted
 
     def aes_decrypt(self, message):
-        return unpad(self.__AES_dec.decrypt(message), AES.block_size)
+        started = time.perf_counter()
+        decrypted = unpad(self.__AES_dec.decrypt(message), AES.block_size)
+        self.__decrypt_time.observe(time.perf_counter() - started)
+        return decrypted
+
+    def collect(self):
+        labels = {'uid': self.__uid}
+        for name, value in self.__counters.items():
+            yield 'autopvp_%s_total' % name, 'counter', labels, value
+        for stage, value in self.__receiver.counters.items():
+            yield 'autopvp_frames_received_total', 'counter', dict(labels, stage=stage), value
+        yield from self.__sender.collect(labels)
+        yield from self.__wire.collect(labels)
+        yield 'autopvp_encrypt_seconds', 'histogram', labels, self.__encrypt_time
+        yield 'autopvp_decrypt_seconds', 'histogram', labels, self.__decrypt_time
+        for url, stats in self.__handler_stats.items():
+            yield 'autopvp_handler_calls_total', 'counter', dict(labels, url=url), stats.calls
+            yield 'autopvp_handler_seconds_p99', 'gauge', dict(labels, url=url), stats.percentile(0.99)
+        yield 'autopvp_level', 'gauge', labels, abs(self.__level)
+        yield 'autopvp_inc_factor', 'gauge', labels, self.__INC_FACTOR
+        yield 'autopvp_dec_factor', 'gauge', labels, self.__DEC_FACTOR
+        yield 'autopvp_quota_users', 'gauge', labels, len(self.__USER_LIST)
+        if self.__opponent_uid in self.__USER_LIST:
+            yield 'autopvp_opponent_quota_left', 'gauge', labels, self.__USER_LIST.left(self.__opponent_uid)
+        yield 'autopvp_reconnects_total', 'counter', labels, max(0, self.connections - 1)
 
     def __generate_headers(self):
         timestamp = str(int(time.time() * 1000))
@@ -54,11 +169,6 @@ class AutoPVPApp(object):
             "time-stamp": timestamp, 
             "token": self.__token, 
             "uid": self.__uid,
-            "Connection": "Upgrade", 
-            "Upgrade": "websocket", 
-            "Sec-WebSocket-Extensions": "permessage-deflate",
-            "Sec-WebSocket-Key": b64encode(os.urandom(16)),
-            "Sec-WebSocket-Version": "13"
         }
         return headers
 
@@ -81,25 +191,36 @@ class AutoPVPApp(object):
         }
         return default
 
-    def __format_message(self, message):
+    def __format_message(self, message, cache_key=None, static=False):
+        # the plaintext size is kept next to the frame, so a cached frame is never serialized again,
+        # both go with the frame to the sender, which accounts the frame once it is written
+        if cache_key is None:
+            frame, size = self.__encode_message(message)
+        else:
+            frame, size = self.__frame_cache.get(cache_key, message, self.__encode_message, static=static)
+        self.__frame_info[frame] = (message['url'], size)
+        return frame
+
+    def __encode_message(self, message):
         ready = json.dumps(message, separators=(',', ':'))
-        logger.debug('[Encrypt]: %s' % ready)
-        encrypted = self.aes_encrypt(ready.encode())
+        frame_logger.debug('[Encrypt]: %s', ready)
+        plaintext = ready.encode()
+        encrypted = self.aes_encrypt(plaintext)
         ready_to_hash = encrypted + self.__salt
         encrypted_hash = hashlib.md5(ready_to_hash.encode()).hexdigest()
         message = encrypted_hash + encrypted
-        logger.debug('[Send][->]: %s' % message)
-        return message
+        frame_logger.debug('[Send][->]: %s', message)
+        return message, len(plaintext)
 
     def __get_enter_room_message(self) -> str:
         logger.info('The bot is entering the whole pvp room ...')
         enter_room = {'version': self.__compat_version, 'url': "enter"}
-        return self.__format_message(enter_room)
+        return self.__format_message(enter_room, cache_key=('enter', self.__compat_version), static=True)
 
     def __get_hello_message(self) -> str:
         logger.info('The bot is sending a hello message ...')
         hello_message = {'url': 'room/message', 'msg': '--- 请忽略上方信息 ---\n欢迎进入自动对战房间，此房间尚在测试阶段，可能有较多bug，如遇bug，请联系项目开发者tonyXFY。'}
-        return self.__format_message(hello_message)
+        return self.__format_message(hello_message, cache_key='hello', static=True)
 
     def __get_create_room_message(self) -> str:
         logger.info('The bot is creating a single battle room ... ')
@@ -125,7 +246,7 @@ class AutoPVPApp(object):
             edit_room['row'] = 16
             edit_room['column'] = 30
             edit_room['mine'] = 99
-        return self.__format_message(edit_room)
+        return self.__format_message(edit_room, cache_key=('edit', mode, self.__room_id))
 
     def __get_ready_status_message(self, ready: bool=True) -> str:
         if ready:
@@ -133,22 +254,22 @@ class AutoPVPApp(object):
         else:
             logger.info('The bot is not getting ready ... ')
         ready_status = {'ready': ready, 'url': 'room/ready'}
-        return self.__format_message(ready_status)
+        return self.__format_message(ready_status, cache_key=('ready', ready), static=True)
 
     def __get_start_battle_message(self) -> str:
         logger.info('The bot is starting a battle ...')
         start_battle = {'url': 'room/start'}
-        return self.__format_message(start_battle)
+        return self.__format_message(start_battle, cache_key='start', static=True)
 
     def __get_battle_board_message(self) -> str:
         logger.info('The bot is analyzing the board ...')
         battle_board = {'url': 'minesweeper/info'}
-        return self.__format_message(battle_board)
+        return self.__format_message(battle_board, cache_key='info', static=True)
 
     def __get_battle_progress_message(self, current_bv: int) -> str:
-        logger.info('The bot is solving %d bv ...' % (current_bv))
+        logger.info('The bot is solving %d bv ...', current_bv)
         battle_progress = {'bv': current_bv, 'url': 'minesweeper/progress'}
-        return self.__format_message(battle_progress)
+        return self.__format_message(battle_progress, cache_key=('progress', current_bv))
 
     def __get_bot_success_message(self, map_bv: int, finish_time: float) -> str:
         logger.info('The bot is ready to finish the battle ...')
@@ -160,17 +281,17 @@ class AutoPVPApp(object):
     def __get_room_edit_warning_message(self) -> str:
         logger.warning('The bot detected violation of the room rules ...')
         room_edit_warning = {'url': 'room/message', 'msg': '机器人仅支持“双人，非匿名，无雷币，回合数为1，无加密，自动开局，不强制NF，不限制排名”的房间，请重新设置房间，否则机器人不会准备游戏。'}
-        return self.__format_message(room_edit_warning)
+        return self.__format_message(room_edit_warning, cache_key='edit_warning', static=True)
 
     def __get_room_kick_out_message(self, uid) -> str:
         logger.info('The bot is kicking out a banned user ...')
         room_kick_out = {'uid': uid, 'url': 'room/kick'}
-        return self.__format_message(room_kick_out)
+        return self.__format_message(room_kick_out, cache_key=('kick', uid))
 
     def __get_exit_room_message(self) -> str:
         logger.info('The bot is exiting the battle room ...')
         exit_room = {'url': 'room/exit'}
-        return self.__format_message(exit_room)
+        return self.__format_message(exit_room, cache_key='exit', static=True)
 
     def __get_level_status_message(self) -> str:
         logger.info('The bot is getting level status ...')
@@ -181,11 +302,11 @@ class AutoPVPApp(object):
     def __get_error_command_message(self) -> str:
         logger.info('The bot is getting level status ...')
         error_command = {'url': 'room/message', 'msg': '错误的语法指令'}
-        return self.__format_message(error_command)
+        return self.__format_message(error_command, cache_key='error_command', static=True)
 
     def __get_left_games_message(self, uid) -> str:
         logger.info('The bot is reminding left games...')
-        left_games = {'url': 'room/message', 'msg': '剩余游戏局数: %d，玩家将在本小时内无法游戏。' % self.__USER_LIST[uid]['left']}
+        left_games = {'url': 'room/message', 'msg': '剩余游戏局数: %d，玩家将在本小时内无法游戏。' % self.__USER_LIST.left(uid)}
         return self.__format_message(left_games)
 
     def __user_message_parser(self, split_arg) -> tuple:
@@ -195,12 +316,12 @@ class AutoPVPApp(object):
             if split_arg[0] in ['level', 'lv', 'lvl'] and argc >= 2:
                 if split_arg[1] in ['up', 'u']:
                     self.__level = self.__level + 0.5 if self.__level <= self.__MAX_LEVEL - 0.5 else self.__MAX_LEVEL
-                    logger.info('Leveling up to %.3f...' % self.__level)
+                    logger.info('Leveling up to %.3f...', self.__level)
                 elif split_arg[1] in ['down', 'd']:
                     self.__level = self.__level - 0.5 if self.__level >= self.__MIN_LEVEL + 0.5 else self.__MIN_LEVEL
-                    logger.info('Leveling down to %.3f...' % self.__level)
+                    logger.info('Leveling down to %.3f...', self.__level)
                 elif split_arg[1] in ['status', 's']:
-                    logger.info('Level status: %.3f...' % self.__level)
+                    logger.info('Level status: %.3f...', self.__level)
                 elif split_arg[1] in ['holdon', 'n']:
                     logger.info('Level will not change automatically ...')
                     self.__level_hold_on = True
@@ -213,11 +334,11 @@ class AutoPVPApp(object):
                         logger.warning('Bound exceeded, will not change level ...')
                         return False
                     else:
-                        logger.info('Changing level to %.3f ...' % level)
+                        logger.info('Changing level to %.3f ...', level)
                         self.__level = level
                 return self.__get_level_status_message()
             elif split_arg[0] in ['level', 'lv', 'lvl'] and argc == 1:
-                logger.info('Level status: %.3f...' % self.__level)
+                logger.info('Level status: %.3f...', self.__level)
                 return self.__get_level_status_message()
             elif split_arg[0] in ['beg', 'b', 'int', 'i', 'exp-v', 'ev', 'e1', 'exp-h', 'eh', 'e2']:
                 mode_ref = {
@@ -225,7 +346,7 @@ class AutoPVPApp(object):
                     'exp-v': 3, 'ev': 3, 'e1': 3, 'exp-h': 4, 'eh': 4, 'e2': 4, 
                 }
                 mode = mode_ref[split_arg[0]]
-                logger.info('Setting room mode: %d' % mode)
+                logger.info('Setting room mode: %d', mode)
                 return self.__get_edit_room_message(mode=mode)
             else:
                 return self.__get_error_command_message()
@@ -234,30 +355,32 @@ class AutoPVPApp(object):
             logger.error(traceback.format_exc())
             return self.__get_error_command_message()
 
-    def __get_est_bvs(self, level, difficulty, bv):
-        score = level * 10
-        qg_ref = {
-            'exph': 435.001 / 1.000 / score,
-            'expv': 435.001 / 1.000 / score,
-            'int': 153.730 / 1.020 / score,
-            'beg': 47.299 / 1.765 / score,
-        }
-        qg = qg_ref[difficulty]
-        est_time = (qg * bv) ** (1 / 1.7)
-        est_bvs = bv / est_time
-        return est_bvs
-
-    def __get_est_level(self, difficulty, time, solved_bv, bv):
-        qg_est = time ** 1.7 / solved_bv * math.sqrt(solved_bv / bv)
-        score_ref = {
-            'exph': 435.001 / 1.000 / qg_est,
-            'expv': 435.001 / 1.000 / qg_est,
-            'int': 153.730 / 1.020 / qg_est,
-            'beg': 47.299 / 1.765 / qg_est,        
-        }
-        score = score_ref[difficulty]
-        est_level = score / 10
-        return est_level
+    def __get_est_bvs(self, level, size, bv):
+        return get_est_bvs(level, size, bv)
+
+    def __get_est_level(self, size, time, solved_bv, bv):
+        return get_est_level(size, time, solved_bv, bv)
+
+    def __update_level(self, won, est_level):
+        level, inc_factor, dec_factor = update_level(won, self.__level, est_level, self.__INC_FACTOR, self.__DEC_FACTOR, self.__MIN_LEVEL, self.__MAX_LEVEL)
+        self.__level, self.__INC_FACTOR, self.__DEC_FACTOR = float(level), float(inc_factor), float(dec_factor)
+
+    def __rate_game(self, won):
+        game = self.__game
+        if not game.played():
+            logger.info('The battle ended before it started, level stays at %.3f ...', self.__level)
+            return
+        elapsed = game.finished_time - game.started_time
+        # the estimate takes a power of the time, a game without time or progress would turn the level complex
+        if not is_rated(elapsed, game.opponent_solved_bv):
+            logger.info('The battle is not rated, level stays at %.3f ...', self.__level)
+            return
+        est_level = self.__get_est_level(game.size, elapsed, game.opponent_solved_bv, game.bv)
+        prev_level = self.__level
+        self.__update_level(won, est_level)
+        logger.info('Level changes a bit [%.3f -> %.3f] ...', prev_level, self.__level)
+        logger.info('The increasing factor is set to: %.3f', self.__INC_FACTOR)
+        logger.info('The decreasing factor is set to: %.3f', self.__DEC_FACTOR)
 
     def __get_default_level(self, user_level):
         level = 0.5 * user_level + 0.5 if user_level >= 0 else 4.0
@@ -267,170 +390,296 @@ class AutoPVPApp(object):
 
     def reset_user_list(self):
         logger.info('Resuming user list ...')
-        for user in self.__USER_LIST.keys():
-            self.__USER_LIST[user]['left'] = self.__USER_LIST[user]['original']
-        logger.debug('Current user list: %s' % self.__USER_LIST)
-
-    async def run(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.ws_connect(url=self.__url, heartbeat=10.0, headers=self.__generate_headers()) as ws:
-                await ws.send_str(self.__get_enter_room_message())
-
-                opponent_uid = ''
-                is_gaming = False
-
-                async for msg in ws:
-                    if msg.type == aiohttp.WSMsgType.TEXT:
-                        decrypt_message = self.aes_decrypt(bytes.fromhex(msg.data[32:]))
-                        text_message = json.loads(decrypt_message)
-                        logger.debug('[Recv][<-]: %s' % text_message)
-
-                        if 'url' in text_message:
-                            if not is_gaming:
-                                current_game_started_time = 0
-                                current_game_finished_time = 0
-                                current_game_bv = 0
-                                current_game_bvs = 0
-                                current_game_opponent_solved_bv = 1 # This should avoid bugs in calcuation
-                                current_game_difficulty = ''
-
-                                if text_message['url'] == 'pvp/enter':
-                                    await ws.send_str(self.__get_create_room_message())
-                                elif text_message['url'] == 'pvp/room/enter/event' and self.__uid != text_message['user']['pvp']['uid']:
-                                    opponent_uid = text_message['user']['pvp']['uid']
-                                    logger.info('An opponent entered the room ...')
-                                    await ws.send_str(self.__get_hello_message())
-                                    self.__RESUMED = False
-                                    self.__level = self.__get_default_level(text_message['user']['user']['timingLevel'])
-                                    if opponent_uid not in self.__USER_LIST:
-                                        self.__USER_LIST[opponent_uid] = {}
-                                        if text_message['user']['user']['vip']:
-                                            self.__USER_LIST[opponent_uid]['original'] = self.__VIP_COUNTS
-                                            self.__USER_LIST[opponent_uid]['left'] = self.__VIP_COUNTS
-                                        else:
-                                            self.__USER_LIST[opponent_uid]['original'] = self.__NORMAL_COUNTS
-                                            self.__USER_LIST[opponent_uid]['left'] = self.__NORMAL_COUNTS
-                                    if opponent_uid in ban_list or self.__USER_LIST[opponent_uid]['left'] <= 0:
-                                        logger.info('The opponent is in the ban list ...')
-                                        await ws.send_str(self.__get_room_kick_out_message(uid=opponent_uid))
-                                elif text_message['url'] == 'pvp/room/exit/event' and opponent_uid == text_message['user']['pvp']['uid']:
-                                    if opponent_uid in ban_list:
-                                        logger.info('The opponent is kicked out of the room ...')
-                                    else:
-                                        logger.info('The opponent exited the room ...')
-                                elif text_message['url'] == 'pvp/user/online' and opponent_uid == text_message['uid'] and text_message['offline']:
-                                    logger.info('The opponent is offline now, refreshing the room ...')
-                                    await ws.send_str(self.__get_exit_room_message())
-                                elif text_message['url'] == 'pvp/room/ready' and opponent_uid == text_message['uid'] and text_message['ready']:
-                                    logger.info('The opponent got ready ...')
-                                    await ws.send_str(self.__get_start_battle_message())
-                                elif text_message['url'] == 'pvp/room/update' and self.__uid in text_message['room']['userIdList']:
-                                    if text_message['room']['expired']:
-                                        logger.info('The room has expired ...')
-                                    if text_message['room']['gaming']:
-                                        is_gaming = True
-                                        await ws.send_str(self.__get_battle_board_message())
-                                        self.__USER_LIST[opponent_uid]['left'] -= 1
-                                    else:
-                                        logger.info('The room status has been updated ...')
-                                        if not self.__RESUMED:
-                                            await ws.send_str(self.__get_level_status_message())
-                                        if opponent_uid and self.__USER_LIST[opponent_uid]['left'] <= 3:
-                                            await ws.send_str(self.__get_left_games_message(uid=opponent_uid))
-                                        if opponent_uid and self.__USER_LIST[opponent_uid]['left'] <= 0:
-                                            await ws.send_str(self.__get_exit_room_message())
-                                        if opponent_uid == text_message['room']['users'][0]['pvp']['uid']:
-                                            if text_message['room']['coin'] == 0 and len(text_message['room']['password']) == 0 and text_message['room']['minesweeperAutoOpen'] and not text_message['room']['minesweeperFlagForbidden'] and text_message['room']['round'] == 1 and text_message['room']['maxNumber'] == 2: 
-                                                await ws.send_str(self.__get_ready_status_message())
-                                            else:
-                                                await ws.send_str(self.__get_room_edit_warning_message())
-                                        if len(opponent_uid) != 0 and (len(text_message['room']['userIdList']) != 2 or opponent_uid not in text_message['room']['userIdList']) and opponent_uid not in ban_list and not self.__RESUMED:
-                                            await ws.send_str(self.__get_edit_room_message())
-                                            self.__RESUMED = True
-
-                                elif text_message['url'] == 'pvp/room/exit':
-                                    # keep alive
-                                    self.__level_hold_on = False
-                                    self.__INC_FACTOR = 0.24
-                                    self.__DEC_FACTOR = 0.08
-                                    opponent_uid = ''
-                                    logger.info('The bot left the room ...')
-                                    logger.info('Re-creating the room ...')
-                                    await ws.send_str(self.__get_create_room_message())
-                                elif text_message['url'] == 'pvp/room/message' and opponent_uid == text_message['msg']['user']['uid']:
-                                    message = text_message['msg']['message'].strip().split()
-                                    if message:
-                                        result = self.__user_message_parser(message)
-                                        await ws.send_str(result)
-
-                            else:
-                                if text_message['url'] == 'pvp/minesweeper/info':
-                                    tmp_level = self.__level
-                                    board = get_board(text_message['cells'][0].split('-')[0: -1])
-                                    board_result = get_board_result(board)
-                                    current_game_bv = board_result['bv']
-                                    current_game_difficulty = board_result['difficulty']
-                                    current_game_bvs = self.__get_est_bvs(tmp_level, current_game_difficulty, current_game_bv)
-                                    await ws.send_str(self.__get_battle_progress_message(1))
-                                    logger.info('The battle is ready to start, wait for 6 seconds ...')
-                                    time.sleep(6) # first preparation cold time
-                                    current_game_started_time = time.time()
-                                    logger.info('The battle is started ...')
-                                elif text_message['url'] == 'pvp/minesweeper/progress':
-                                    if text_message['uid'] == self.__uid:
-                                        if text_message['bv'] == current_game_bv:
-                                            current_game_finished_time = time.time()
-                                            await ws.send_str(self.__get_bot_success_message(current_game_bv, current_game_finished_time - current_game_started_time))
-                                        else:
-                                            await ws.send_str(self.__get_battle_progress_message(text_message['bv'] + 1))
-                                            time.sleep(1 / current_game_bvs) # cold time by bvs
-                                    elif text_message['uid'] == opponent_uid:
-                                        current_game_opponent_solved_bv = text_message['bv']
-                                        logger.info('The opponent is solving %d bv ...' % (current_game_opponent_solved_bv))
-                                    else:
-                                        logger.debug('This is another game out of the room ...')
-                                elif text_message['url'] == 'pvp/minesweeper/win':
-                                    is_gaming = False
-                                    winner_uid = text_message['users'][0]['pvp']['uid']
-                                    if winner_uid == self.__uid:
-                                        logger.info('The bot won the battle ...')
-                                        if not self.__level_hold_on:
-                                            est_level = self.__get_est_level(current_game_difficulty, current_game_finished_time - current_game_started_time, current_game_opponent_solved_bv, current_game_bv)
-                                            prev_level = self.__level
-                                            self.__level = self.__level - (self.__level - est_level) * self.__DEC_FACTOR
-                                            if self.__level < self.__MIN_LEVEL:
-                                                self.__level = self.__MIN_LEVEL
-                                            logger.info('Level changes a bit [%.3f -> %.3f] ...' % (prev_level, self.__level))
-                                            self.__INC_FACTOR = self.__INC_FACTOR / 2.0 if self.__INC_FACTOR > 0.07 else 0.06
-                                            self.__DEC_FACTOR = self.__DEC_FACTOR * 2.0 if self.__DEC_FACTOR < 0.31 else 0.32
-                                            logger.info('The increasing factor is set to: %.3f' % (self.__INC_FACTOR))
-                                            logger.info('The decreasing factor is set to: %.3f' % (self.__DEC_FACTOR))
-
-                                    elif winner_uid == opponent_uid:
-                                        logger.info('The opponent won the battle ...')
-                                        if not self.__level_hold_on:
-                                            current_game_finished_time = time.time()
-                                            est_level = self.__get_est_level(current_game_difficulty, current_game_finished_time - current_game_started_time, current_game_opponent_solved_bv, current_game_bv)
-                                            prev_level = self.__level
-                                            self.__level = self.__level + (est_level - self.__level) * self.__INC_FACTOR
-                                            if self.__level > self.__MAX_LEVEL:
-                                                self.__level = self.__MAX_LEVEL
-                                            logger.info('Level changes a bit [%.3f -> %.3f] ...' % (prev_level, self.__level))
-                                            self.__INC_FACTOR = self.__INC_FACTOR * 2.0 if self.__INC_FACTOR < 0.47 else 0.48
-                                            self.__DEC_FACTOR = self.__DEC_FACTOR / 2.0 if self.__DEC_FACTOR > 0.05 else 0.04
-                                            logger.info('The increasing factor is set to: %.3f' % (self.__INC_FACTOR))
-                                            logger.info('The decreasing factor is set to: %.3f' % (self.__DEC_FACTOR))
-
-                                elif text_message['url'] == 'pvp/room/user/exit' and opponent_uid == text_message['user']['pvp']['uid']:
-                                    logger.info('The opponent ran away ...')
-
-                        else:
-                            code = text_message['code']
-                            logger.warning('Something weird is happening, HTTP code: %d' % code)
-                            if code == 10100:
-                                logger.error('Incompatible version type, please update your version number.')
-                            break
-
-                    elif msg.type == aiohttp.WSMsgType.ERROR:
-                        logger.warning('The websocket connection encounters an error: %s' % msg.data)
+        self.__USER_LIST.reset()
+
+    def save_state(self):
+        self.__USER_LIST.save()
+        self.__LEVEL_MEMORY.save()
+        if self.__history is not None:
+            self.__history.flush()
+
+    def close(self):
+        # the writer thread of the history is a daemon, it has to finish its queue before the process exits
+        self.save_state()
+        if self.__history is not None:
+            self.__history.close()
+        if self.__recorder is not None:
+            self.__recorder.close()
+
+    def __remember_opponent(self):
+        if self.__opponent_uid:
+            self.__LEVEL_MEMORY.put(self.__opponent_uid, abs(self.__level), self.__INC_FACTOR, self.__DEC_FACTOR)
+
+    def handler_stats(self):
+        return {url: stats.summary() for url, stats in self.__handler_stats.items()}
+
+    def wire_stats(self):
+        # {(direction, url): [frames, raw bytes, decrypted bytes, sampled raw bytes, sampled compressed bytes]}
+        return self.__wire.snapshot()
+
+    async def __send(self, message, priority=PRIORITY_NORMAL, coalesce_key=None):
+        # frames are written by the sender task, so a slow socket never holds up the reader
+        if not isinstance(message, str):
+            logger.warning('Refusing to send a %s instead of a frame ...', type(message).__name__)
+            return
+        self.__counters['frames_sent'] += 1
+        url, size = self.__frame_info.pop(message, ('', 0))
+        await self.__sender.put(message, priority, coalesce_key, url, size)
+
+    async def __send_progress(self, bv):
+        await self.__send(self.__get_battle_progress_message(bv), PRIORITY_GAME, 'progress')
+
+    async def __send_success(self, finished_time, elapsed_time):
+        self.__game.finished_time = finished_time
+        await self.__send(self.__get_bot_success_message(self.__game.bv, elapsed_time), PRIORITY_GAME)
+
+    async def drain(self):
+        await self.__sender.drain()
+
+    async def __on_enter(self, text_message):
+        await self.__send(self.__get_create_room_message())
+
+    async def __on_room_enter_event(self, text_message):
+        if self.__uid == text_message['user']['pvp']['uid']:
+            return
+        opponent_uid = self.__opponent_uid = text_message['user']['pvp']['uid']
+        logger.info('An opponent entered the room ...')
+        await self.__send(self.__get_hello_message())
+        self.__RESUMED = False
+        remembered = self.__LEVEL_MEMORY.get(opponent_uid)
+        if remembered is None:
+            self.__level = self.__get_default_level(text_message['user']['user']['timingLevel'])
+        else:
+            self.__level, self.__INC_FACTOR, self.__DEC_FACTOR = remembered
+            logger.info('The opponent is remembered at level %.3f ...', self.__level)
+        if text_message['user']['user']['vip']:
+            self.__USER_LIST.register(opponent_uid, self.__VIP_COUNTS)
+        else:
+            self.__USER_LIST.register(opponent_uid, self.__NORMAL_COUNTS)
+        if opponent_uid in self.__BAN_LIST or self.__USER_LIST.left(opponent_uid) <= 0:
+            logger.info('The opponent is in the ban list ...')
+            await self.__send(self.__get_room_kick_out_message(uid=opponent_uid))
+
+    async def __on_room_exit_event(self, text_message):
+        if self.__opponent_uid != text_message['user']['pvp']['uid']:
+            return
+        if self.__opponent_uid in self.__BAN_LIST:
+            logger.info('The opponent is kicked out of the room ...')
+        else:
+            logger.info('The opponent exited the room ...')
+        self.__remember_opponent()
+
+    async def __on_user_online(self, text_message):
+        if self.__opponent_uid == text_message['uid'] and text_message['offline']:
+            logger.info('The opponent is offline now, refreshing the room ...')
+            await self.__send(self.__get_exit_room_message())
+
+    async def __on_room_ready(self, text_message):
+        if self.__opponent_uid == text_message['uid'] and text_message['ready']:
+            logger.info('The opponent got ready ...')
+            await self.__send(self.__get_start_battle_message())
+
+    async def __on_room_update(self, text_message):
+        room = text_message['room']
+        opponent_uid = self.__opponent_uid
+        if self.__uid not in room['userIdList']:
+            return
+        if room['expired']:
+            logger.info('The room has expired ...')
+        if room['gaming']:
+            self.__is_gaming = True
+            self.__game = GameState()
+            self.__counters['games_started'] += 1
+            await self.__send(self.__get_battle_board_message())
+            self.__USER_LIST.consume(opponent_uid)
+            return
+
+        logger.info('The room status has been updated ...')
+        if not self.__RESUMED:
+            await self.__send(self.__get_level_status_message())
+        if opponent_uid and self.__USER_LIST.left(opponent_uid) <= 3:
+            await self.__send(self.__get_left_games_message(uid=opponent_uid))
+        if opponent_uid and self.__USER_LIST.left(opponent_uid) <= 0:
+            await self.__send(self.__get_exit_room_message())
+        if opponent_uid == room['users'][0]['pvp']['uid']:
+            if room['coin'] == 0 and len(room['password']) == 0 and room['minesweeperAutoOpen'] and not room['minesweeperFlagForbidden'] and room['round'] == 1 and room['maxNumber'] == 2:
+                await self.__send(self.__get_ready_status_message())
+            else:
+                await self.__send(self.__get_room_edit_warning_message())
+        if len(opponent_uid) != 0 and (len(room['userIdList']) != 2 or opponent_uid not in room['userIdList']) and opponent_uid not in self.__BAN_LIST and not self.__RESUMED:
+            await self.__send(self.__get_edit_room_message())
+            self.__RESUMED = True
+
+    async def __on_room_exit(self, text_message):
+        # keep alive
+        self.__pacer.cancel()
+        self.__remember_opponent()
+        self.__level_hold_on = False
+        self.__INC_FACTOR = 0.24
+        self.__DEC_FACTOR = 0.08
+        self.__opponent_uid = ''
+        logger.info('The bot left the room ...')
+        logger.info('Re-creating the room ...')
+        await self.__send(self.__get_create_room_message())
+
+    async def __on_room_message(self, text_message):
+        if self.__opponent_uid != text_message['msg']['user']['uid']:
+            return
+        message = text_message['msg']['message'].strip().split()
+        if message:
+            result = self.__user_message_parser(message)
+            if result:
+                await self.__send(result)
+
+    async def __on_battle_info(self, text_message):
+        game = self.__game
+        tmp_level = self.__level
+        cells = text_message['cells'][0]
+        board_result = await self.__offloader.run(get_cells_result, cells)
+        game.bv = board_result['bv']
+        game.difficulty = board_result['difficulty']
+        game.size = (board_result['row'], board_result['column'], board_result['mines'])
+        game.op = board_result['op']
+        game.islands = board_result['is']
+        game.level = tmp_level
+        game.bvs = self.__get_est_bvs(tmp_level, game.size, game.bv)
+        if self.__pacing == 'plan':
+            steps, finish = await self.__offloader.run(cells_schedule, cells, game.bvs)
+        else:
+            steps, finish = uniform_schedule(game.bv, game.bvs)
+        self.__pacer.start(steps, finish, delay=6) # first preparation cold time
+        game.started_time = self.__pacer.started_time
+        await self.__send_progress(1)
+        logger.info('The battle is ready to start, wait for 6 seconds ...')
+
+    async def __on_battle_progress(self, text_message):
+        if text_message['uid'] == self.__uid:
+            self.__pacer.advance(text_message['bv'])
+        elif text_message['uid'] == self.__opponent_uid:
+            self.__game.opponent_solved_bv = text_message['bv']
+            logger.info('The opponent is solving %d bv ...', self.__game.opponent_solved_bv)
+        else:
+            logger.debug('This is another game out of the room ...')
+
+    async def __on_battle_win(self, text_message):
+        game = self.__game
+        self.__is_gaming = False
+        self.__pacer.cancel()
+        self.__counters['games_finished'] += 1
+        winner_uid = text_message['users'][0]['pvp']['uid']
+        # the pacer sets the finish of the bot, every other end of the game is now, whether the level is held or not
+        if winner_uid != self.__uid or not game.finished_time:
+            game.finished_time = time.time()
+        if winner_uid == self.__uid:
+            self.__counters['wins'] += 1
+            logger.info('The bot won the battle ...')
+            if not self.__level_hold_on:
+                self.__rate_game(True)
+
+        elif winner_uid == self.__opponent_uid:
+            self.__counters['losses'] += 1
+            logger.info('The opponent won the battle ...')
+            if not self.__level_hold_on:
+                self.__rate_game(False)
+
+        self.__remember_opponent()
+        if self.__history is not None:
+            winner = WINNER_BOT if winner_uid == self.__uid else WINNER_OPPONENT if winner_uid == self.__opponent_uid else WINNER_OTHER
+            self.__history.append(self.__opponent_uid, game.size, game.bv, game.op, game.islands, game.opponent_solved_bv, winner,
+                game.bvs, game.finished_time - game.started_time if game.played() else float('nan'), game.level, self.__level)
+
+    async def __on_room_user_exit(self, text_message):
+        if self.__opponent_uid == text_message['user']['pvp']['uid']:
+            logger.info('The opponent ran away ...')
+            self.__pacer.cancel()
+
+    async def __dispatch(self, text_message):
+        handlers = self.__game_handlers if self.__is_gaming else self.__lobby_handlers
+        handler = handlers.get(text_message['url'])
+        if handler is None:
+            return
+        started = time.perf_counter()
+        try:
+            await handler(text_message)
+        finally:
+            self.__handler_stats[text_message['url']].record(time.perf_counter() - started)
+
+    def attach(self, ws, resume=False):
+        # a resumed session keeps the opponent, whose learned level is kept in the level memory
+        self.__ws = ws
+        self.__sender.start(ws)
+        self.__pacer.cancel()
+        self.__opponent_uid = self.__opponent_uid if resume else ''
+        self.__is_gaming = False
+        self.__game = GameState()
+
+    def detach(self):
+        self.__pacer.cancel()
+        self.__remember_opponent()
+        self.__sender.stop()
+        self.__frame_info.clear()
+        self.__ws = None
+        if self.__recorder is not None:
+            self.__recorder.flush()
+
+    async def feed(self, data):
+        # handles one raw text frame, returns False when the connection should be dropped
+        if self.__recorder is not None:
+            self.__recorder.record(data)
+        text_message = self.__receiver.decode(data, self.__opponent_uid)
+        if text_message is None:
+            return True
+
+        if 'url' in text_message:
+            await self.__dispatch(text_message)
+            return True
+
+        code = text_message['code']
+        logger.warning('Something weird is happening, HTTP code: %d', code)
+        if code == 10100:
+            logger.error('Incompatible version type, please update your version number.')
+        return False
+
+    async def __connect(self, session):
+        # the upgrade and permessage-deflate headers are negotiated by aiohttp itself
+        ws = await session.ws_connect(url=self.__url, heartbeat=10.0, compress=self.__ws_compress, headers=self.__generate_headers())
+        self.connections += 1
+        self.__wire.set_compress(ws.compress)
+        if ws.compress:
+            logger.info('The websocket connection is compressed with window bits %d ...', ws.compress)
+        else:
+            logger.info('The websocket connection is not compressed ...')
+        return ws
+
+    async def run(self, session=None, resume=False):
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self.run(session, resume)
+
+        ws = await self.__connect(session)
+        try:
+            self.attach(ws, resume)
+            await self.__send(self.__get_enter_room_message())
+
+            while True:
+                msg = await ws.receive()
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    if not await self.feed(msg.data):
                         break
+
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    logger.warning('The websocket connection encounters an error: %s', msg.data)
+                    # make before break: the degraded socket is only closed once a new one is open
+                    new_ws = await self.__connect(session)
+                    logger.info('A new websocket connection is established, handing over ...')
+                    await ws.close()
+                    ws = new_ws
+                    self.attach(ws, resume=True)
+                    await self.__send(self.__get_enter_room_message())
+
+                elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED):
+                    logger.warning('The websocket connection is closed ...')
+                    break
+        finally:
+            self.detach()
+            await ws.close()
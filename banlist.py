@@ -0,0 +1,82 @@
+from log import logger
+import importlib
+import os
+import threading
+import time
+
+def get_legacy_ban_list():
+    # older deployments keep their ban list as ban_list in a ban.py module
+    try:
+        module = importlib.import_module('ban')
+    except ImportError:
+        return None
+    return frozenset(str(uid) for uid in getattr(module, 'ban_list', []))
+
+class BanStore(object):
+    def __init__(self, path, check_interval=1.0):
+        self.__path = path
+        self.__check_interval = check_interval
+        self.__users = frozenset()
+        self.__mtime = None
+        self.reload()
+        watcher = threading.Thread(target=self.__watch, name='ban-watcher', daemon=True)
+        watcher.start()
+
+    @property
+    def users(self):
+        return self.__users
+
+    def __contains__(self, uid):
+        return uid in self.__users
+
+    def __len__(self):
+        return len(self.__users)
+
+    def __read(self):
+        users = set()
+        with open(self.__path, 'r', encoding='utf-8') as f:
+            for line in f:
+                uid = line.split('#', 1)[0].strip()
+                if uid:
+                    users.add(uid)
+        return frozenset(users)
+
+    def reload(self):
+        try:
+            mtime = os.stat(self.__path).st_mtime
+        except FileNotFoundError:
+            if self.__mtime != 0:
+                self.__users = get_legacy_ban_list()
+                if self.__users is None:
+                    logger.error('The ban list %s does not exist and there is no ban.py, nobody is banned ...', self.__path)
+                    self.__users = frozenset()
+                else:
+                    logger.warning('The ban list %s does not exist, using %d users from ban.py, please move them to %s ...',
+                        self.__path, len(self.__users), self.__path)
+            self.__mtime = 0
+            return
+        if mtime == self.__mtime:
+            return
+        # the new set is built aside and swapped in with a single assignment
+        self.__users = self.__read()
+        self.__mtime = mtime
+        logger.info('Loaded %d users from the ban list ...', len(self.__users))
+
+    def __watch(self):
+        while True:
+            time.sleep(self.__check_interval)
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error('Failed to reload the ban list: %s', e)
+
+_ban_stores = {}
+_ban_stores_lock = threading.Lock()
+
+def get_ban_store(path):
+    # every bot in a process shares the store, and its watcher, for the same file
+    with _ban_stores_lock:
+        path = os.path.abspath(path)
+        if path not in _ban_stores:
+            _ban_stores[path] = BanStore(path)
+        return _ban_stores[path]
@@ -0,0 +1,103 @@
+from board import get_difficulty
+import numpy as np
+
+def encode_boards(cells_list):
+    # every cells string holds the rows of one board joined by '-', with a trailing '-'
+    first_rows = cells_list[0].split('-')[0: -1]
+    shape = (len(cells_list), len(first_rows), len(first_rows[0]))
+    # boards of another size with the same number of cells would reshape without an error
+    for index, cells in enumerate(cells_list):
+        rows = cells.split('-')[0: -1]
+        if len(rows) != shape[1] or any(len(each_row) != shape[2] for each_row in rows):
+            raise ValueError('board %d is not %dx%d like the first board of the batch' % (index, shape[1], shape[2]))
+    raw = ''.join(cells_list).replace('-', '').encode()
+    return (np.frombuffer(raw, dtype=np.uint8) - ord('0')).reshape(shape)
+
+def get_batch_row(boards):
+    return boards.shape[1]
+
+def get_batch_column(boards):
+    return boards.shape[2]
+
+def neighbourhood(mask):
+    rows, cols = mask.shape[1], mask.shape[2]
+    padded = np.pad(mask, ((0, 0), (1, 1), (1, 1)))
+    for dr in range(0, 3):
+        for dc in range(0, 3):
+            yield padded[:, dr: dr + rows, dc: dc + cols]
+
+def dilate(mask):
+    result = np.zeros_like(mask)
+    for each_shift in neighbourhood(mask):
+        result |= each_shift
+    return result
+
+def count_components(mask):
+    # union-find over the whole batch at once: a spare row and column of empty cells closes every row and board, so
+    # the flat neighbours right, down-left, down and down-right never link two boards, then every round hooks the larger
+    # root of each edge that still crosses two sets onto the smaller one and jumps pointers until all cells point at roots
+    padded = np.pad(mask, ((0, 0), (0, 1), (0, 1)))
+    width = padded.shape[2]
+    stride = padded.shape[1] * width
+    flat = np.concatenate((padded.ravel(), np.zeros(width + 1, dtype=bool)))
+    cells = np.flatnonzero(flat)
+    sources = []
+    targets = []
+    for offset in (1, width - 1, width, width + 1):
+        linked = cells[flat[cells + offset]]
+        sources.append(linked)
+        targets.append(linked + offset)
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    parent = np.arange(flat.size)
+    while len(sources):
+        source_roots = parent[sources]
+        target_roots = parent[targets]
+        crossing = source_roots != target_roots
+        if not crossing.any():
+            break
+        # an edge inside one set stays inside it, so it is dropped for good
+        sources, targets = sources[crossing], targets[crossing]
+        source_roots, target_roots = source_roots[crossing], target_roots[crossing]
+        np.minimum.at(parent, np.maximum(source_roots, target_roots), np.minimum(source_roots, target_roots))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+    roots = cells[parent[cells] == cells]
+    return np.bincount(roots // stride, minlength=mask.shape[0])
+
+def get_batch_mines(boards):
+    return np.count_nonzero(boards == 9, axis=(1, 2))
+
+def get_batch_board_result(boards):
+    mines = boards == 9
+    zeros = boards == 0
+    marker = mines | dilate(zeros)
+    isolated = ~marker
+    result = {}
+    result['row'] = get_batch_row(boards)
+    result['column'] = get_batch_column(boards)
+    result['mines'] = np.count_nonzero(mines, axis=(1, 2))
+    result['difficulty'] = [get_difficulty(result['row'], result['column'], int(mine)) for mine in result['mines']]
+    result['op'] = count_components(zeros)
+    result['bv'] = result['op'] + np.count_nonzero(isolated, axis=(1, 2))
+    result['is'] = count_components(isolated)
+    return result
+
+def get_board_results(cells_list):
+    # per-board view of get_batch_board_result, shaped like board.get_board_result
+    batch = get_batch_board_result(encode_boards(cells_list))
+    results = []
+    for index in range(0, len(cells_list)):
+        results.append({
+            'row': batch['row'],
+            'column': batch['column'],
+            'mines': int(batch['mines'][index]),
+            'difficulty': batch['difficulty'][index],
+            'op': int(batch['op'][index]),
+            'bv': int(batch['bv'][index]),
+            'is': int(batch['is'][index]),
+        })
+    return results
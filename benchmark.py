@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from action import analyze_actions, parse_actions
+from board import adjacent, get_board, get_board_result, get_action
+from batch_board import encode_boards, get_batch_board_result
+from bitboard import get_bitboard_result
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+SIZES = {
+    'beg': (8, 8, 10),
+    'int': (16, 16, 40),
+    'exp-v': (30, 16, 99),
+    'exp-h': (16, 30, 99),
+    'custom-50': (50, 50, 500),
+    'custom-100': (100, 100, 2000),
+}
+
+def generate_cells(row, column, mines, rng):
+    # same layout as the server's 'cells': digits per row, mines as '9', each row followed by '-'
+    board = [[0 for col in range(0, column)] for r in range(0, row)]
+    for position in rng.sample(range(0, row * column), mines):
+        board[position // column][position % column] = 9
+    for r in range(0, row):
+        for col in range(0, column):
+            if board[r][col] != 9:
+                for ready_row, ready_col in adjacent(r, col):
+                    if 0 <= ready_row < row and 0 <= ready_col < column and board[ready_row][ready_col] == 9:
+                        board[r][col] += 1
+    return ''.join(''.join(str(cell) for cell in each_row) + '-' for each_row in board)
+
+def generate_actions(row, column, count, rng):
+    # a replay with occasional chord sequences (2, 3, 1 on the same cell) mixed into plain clicks
+    actions = []
+    current_time = 0
+    while len(actions) < count:
+        r, col = rng.randrange(0, row), rng.randrange(0, column)
+        current_time += rng.randint(20, 400)
+        if rng.random() < 0.2:
+            for operation in (2, 3, 1):
+                actions.append('%d:%d:%d:%d' % (operation, r, col, current_time))
+        else:
+            actions.append('%d:%d:%d:%d' % (rng.choice((1, 1, 1, 2)), r, col, current_time))
+    return actions[0: count]
+
+def percentile(samples, ratio):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(ratio * len(ordered)))]
+
+def summarize(samples, items=None):
+    total = sum(samples)
+    items = len(samples) if items is None else items
+    return {
+        'calls': len(samples),
+        'items': items,
+        'p50_us': percentile(samples, 0.50) * 1e6,
+        'p90_us': percentile(samples, 0.90) * 1e6,
+        'p99_us': percentile(samples, 0.99) * 1e6,
+        'max_us': max(samples) * 1e6,
+        'items_per_sec': items / total if total > 0 else float('inf'),
+    }
+
+def measure(func, inputs):
+    samples = []
+    for each_input in inputs:
+        started = time.perf_counter()
+        func(each_input)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def run_size(row, column, mines, count, rng):
+    cells_list = [generate_cells(row, column, mines, rng) for index in range(0, count)]
+    details = [cells.split('-')[0: -1] for cells in cells_list]
+    boards = [get_board(detail) for detail in details]
+    actions = [generate_actions(row, column, 200, rng) for index in range(0, count)]
+
+    result = {}
+    result['get_board'] = summarize(measure(get_board, details))
+    result['get_board_result'] = summarize(measure(get_board_result, boards))
+    result['get_bitboard_result'] = summarize(measure(get_bitboard_result, boards))
+    result['get_action'] = summarize(measure(get_action, actions))
+    result['parse_actions'] = summarize(measure(lambda action_detail: list(parse_actions(action_detail)), actions))
+    result['analyze_actions'] = summarize(measure(lambda pair: analyze_actions(*pair), list(zip(boards, actions))))
+    batch = encode_boards(cells_list)
+    result['get_batch_board_result'] = summarize(measure(get_batch_board_result, [batch]), items=count)
+    return result
+
+def get_speedups(results, baseline='get_board_result', funcs=('get_bitboard_result', 'get_batch_board_result')):
+    return {func: results[func]['items_per_sec'] / results[baseline]['items_per_sec'] for func in funcs}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the board metrics on seeded random boards.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--count', type=int, default=200, help='boards per size')
+    parser.add_argument('--sizes', nargs='*', default=list(SIZES.keys()), choices=list(SIZES.keys()))
+    parser.add_argument('--output', default='', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    report = {
+        'seed': args.seed,
+        'count': args.count,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'timestamp': int(time.time()),
+        'results': {},
+        'speedups': {},
+    }
+    for name in args.sizes:
+        row, column, mines = SIZES[name]
+        report['results'][name] = run_size(row, column, mines, args.count, rng)
+        for func, stats in report['results'][name].items():
+            print('%-10s %-24s p50 %9.1fus  p99 %9.1fus  %12.1f boards/s' % (name, func, stats['p50_us'], stats['p99_us'], stats['items_per_sec']))
+        report['speedups'][name] = get_speedups(report['results'][name])
+        for func, speedup in report['speedups'][name].items():
+            print('%-10s %-24s %.2fx the boards/s of get_board_result' % (name, func, speedup))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
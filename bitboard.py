@@ -0,0 +1,82 @@
+from board import get_difficulty
+
+# cell (row, col) is bit row * (column + 1) + col, the spare bit closing every row keeps shifts from wrapping into the next row
+MINE_TABLE = str.maketrans('0123456789', '0000000001')
+ZERO_TABLE = str.maketrans('0123456789', '1000000000')
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(bits):
+        return bin(bits).count('1')
+
+class BitBoard(object):
+    def __init__(self, board):
+        self.row = len(board)
+        self.column = len(board[0])
+        self.width = self.column + 1
+        rows = [''.join(each_row) for each_row in board]
+        self.mines = self.__encode(rows, MINE_TABLE)
+        self.zeros = self.__encode(rows, ZERO_TABLE)
+        row_mask = (1 << self.column) - 1
+        self.mask = sum(row_mask << (row * self.width) for row in range(0, self.row))
+
+    def __encode(self, rows, table):
+        # the first cell of a row is its lowest bit, so every row is read backwards, padded with the spare bit
+        return int(''.join('0' + each_row.translate(table)[::-1] for each_row in reversed(rows)), 2)
+
+    def dilate(self, bits):
+        # the cells themselves and all their neighbours
+        bits |= (bits << 1) | (bits >> 1)
+        bits |= (bits << self.width) | (bits >> self.width)
+        return bits & self.mask
+
+    def flood(self, seed, allowed):
+        # the connected part of allowed that contains seed
+        region = seed
+        while True:
+            grown = self.dilate(region) & allowed
+            if grown == region:
+                return region
+            region = grown
+
+    def components(self, cells):
+        while cells:
+            region = self.flood(cells & -cells, cells)
+            cells &= ~region
+            yield region
+
+    def openings(self):
+        # the zeros of every opening, and every cell a click on it reveals
+        for zeros in self.components(self.zeros):
+            yield zeros, self.dilate(zeros)
+
+def get_bitboard_result(board):
+    bitboard = BitBoard(board)
+    opened = 0
+    openings = 0
+    for zeros, cells in bitboard.openings():
+        opened |= cells
+        openings += 1
+    isolated = bitboard.mask & ~bitboard.mines & ~opened
+    result = {}
+    result['row'] = bitboard.row
+    result['column'] = bitboard.column
+    result['mines'] = popcount(bitboard.mines)
+    result['difficulty'] = get_difficulty(result['row'], result['column'], result['mines'])
+    result['op'] = openings
+    result['bv'] = openings + popcount(isolated)
+    result['is'] = sum(1 for island in bitboard.components(isolated))
+    return result
+
+def get_opening_details(board):
+    # every opening is one bv, 'size' is the number of cells it reveals and 'numbers' the numbered cells among them
+    bitboard = BitBoard(board)
+    details = []
+    for zeros, cells in bitboard.openings():
+        size = popcount(cells)
+        details.append({'size': size, 'zeros': popcount(zeros), 'numbers': size - popcount(zeros)})
+    return details
+
+def get_cells_result(cells):
+    return get_bitboard_result(cells.split('-')[0: -1])
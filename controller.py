@@ -0,0 +1,37 @@
+import numpy as np
+
+# bounds of the adaptive factors, a factor is clamped once it comes within MARGIN of a bound
+INC_MIN = 0.06
+INC_MAX = 0.48
+DEC_MIN = 0.04
+DEC_MAX = 0.32
+MARGIN = 0.01
+
+def is_rated(elapsed, solved_bv):
+    # only a game that ran for some time and in which the opponent solved something says anything about the opponent
+    return elapsed > 0 and solved_bv > 0
+
+def update_level(won, level, est_level, inc_factor, dec_factor, min_level, max_level,
+        inc_min=INC_MIN, inc_max=INC_MAX, dec_min=DEC_MIN, dec_max=DEC_MAX):
+    # vectorized over any broadcastable arrays: a win moves the level down towards the estimate and makes the next drop faster,
+    # a loss moves it up and makes the next rise faster
+    won = np.asarray(won, dtype=bool)
+    level = np.asarray(level)
+    est_level = np.asarray(est_level)
+    inc_factor = np.asarray(inc_factor)
+    dec_factor = np.asarray(dec_factor)
+    # rounded, so the default bounds give exactly the thresholds 0.07, 0.47, 0.31 and 0.05
+    inc_halve_above = np.round(np.asarray(inc_min) + MARGIN, 10)
+    inc_double_below = np.round(np.asarray(inc_max) - MARGIN, 10)
+    dec_double_below = np.round(np.asarray(dec_max) - MARGIN, 10)
+    dec_halve_above = np.round(np.asarray(dec_min) + MARGIN, 10)
+    new_level = np.where(won,
+        np.maximum(level - (level - est_level) * dec_factor, min_level),
+        np.minimum(level + (est_level - level) * inc_factor, max_level))
+    new_inc_factor = np.where(won,
+        np.where(inc_factor > inc_halve_above, inc_factor / 2.0, inc_min),
+        np.where(inc_factor < inc_double_below, inc_factor * 2.0, inc_max))
+    new_dec_factor = np.where(won,
+        np.where(dec_factor < dec_double_below, dec_factor * 2.0, dec_max),
+        np.where(dec_factor > dec_halve_above, dec_factor / 2.0, dec_min))
+    return new_level, new_inc_factor, new_dec_factor
@@ -0,0 +1,61 @@
+import functools
+import math
+import numpy as np
+
+EXPONENT = 1.7
+
+# time coefficients of the standard boards, keyed by (row, column, mines)
+COEFFICIENTS = {
+    (8, 8, 10): 47.299 / 1.765,
+    (16, 16, 40): 153.730 / 1.020,
+    (16, 30, 99): 435.001 / 1.000,
+    (30, 16, 99): 435.001 / 1.000,
+}
+
+# other boards follow a plane through the standard boards in log space:
+#     log(coefficient) = a + b * log(mines) + c * log(mines / (row * column))
+# beginner and intermediate share a density of 0.156, so b is the growth with the number of mines at a fixed density,
+# and c is the correction that expert, at a density of 0.206, needs on top of it. three boards fit the plane exactly,
+# a board outside their range is extrapolated along it
+_ANCHORS = sorted({(math.log(size[2]), math.log(size[2] / (size[0] * size[1])), math.log(coefficient)) for size, coefficient in COEFFICIENTS.items()})
+_PLANE = np.linalg.lstsq(np.array([(1.0, log_mines, log_density) for log_mines, log_density, log_coefficient in _ANCHORS]),
+    np.array([anchor[2] for anchor in _ANCHORS]), rcond=None)[0]
+
+def interpolate_coefficients(row, column, mines):
+    # vectorized over any broadcastable arrays of rows, columns and mines
+    mines = np.maximum(np.asarray(mines, dtype=np.float64), 1.0)
+    cells = np.maximum(np.asarray(row, dtype=np.float64) * np.asarray(column, dtype=np.float64), mines)
+    return np.exp(_PLANE[0] + _PLANE[1] * np.log(mines) + _PLANE[2] * np.log(mines / cells))
+
+@functools.lru_cache(maxsize=1024)
+def get_coefficient(row, column, mines):
+    size = (row, column, mines)
+    if size in COEFFICIENTS:
+        return COEFFICIENTS[size]
+    return float(interpolate_coefficients(row, column, mines))
+
+def get_coefficients(sizes):
+    return np.array([get_coefficient(*size) for size in sizes], dtype=np.float64)
+
+def estimate_bvs(levels, coefficients, bvs):
+    # vectorized over any broadcastable arrays of levels, board coefficients and bvs
+    levels = np.asarray(levels, dtype=np.float64)
+    bvs = np.asarray(bvs, dtype=np.float64)
+    est_time = (np.asarray(coefficients) / (levels * 10) * bvs) ** (1 / EXPONENT)
+    return bvs / est_time
+
+def estimate_levels(coefficients, times, solved_bvs, bvs):
+    solved_bvs = np.asarray(solved_bvs, dtype=np.float64)
+    qg_est = np.asarray(times, dtype=np.float64) ** EXPONENT / solved_bvs * np.sqrt(solved_bvs / np.asarray(bvs, dtype=np.float64))
+    return np.asarray(coefficients) / qg_est / 10
+
+def get_est_bvs(level, size, bv):
+    score = level * 10
+    qg = get_coefficient(*size) / score
+    est_time = (qg * bv) ** (1 / EXPONENT)
+    return bv / est_time
+
+def get_est_level(size, time, solved_bv, bv):
+    qg_est = time ** EXPONENT / solved_bv * math.sqrt(solved_bv / bv)
+    score = get_coefficient(*size) / qg_est
+    return score / 10
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from autopvp import AutoPVPApp
+from log import logger
+from supervisor import run_bots
+from apscheduler.schedulers.background import BackgroundScheduler
+import argparse
+import asyncio
+import importlib
+import sys
+
+def save_states(apps):
+    for app in apps:
+        app.save_state()
+
+def close_apps(apps):
+    for app in apps:
+        app.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run several bots in one process.')
+    parser.add_argument('configs', nargs='*', default=['account_config'], help='account configuration modules')
+    parser.add_argument('--metrics-port', type=int, default=0, help='serve Prometheus metrics on this port')
+    args = parser.parse_args(sys.argv[1:])
+    apps = [AutoPVPApp(config=importlib.import_module(name)) for name in args.configs]
+    logger.info('Fleet has been loaded with %d bots ...', len(apps))
+
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(func=save_states, args=(apps,), trigger='cron', hour='*', misfire_grace_time=30)
+    scheduler.start()
+    logger.info('Scheduler has been activated ...')
+
+    try:
+        asyncio.run(run_bots(apps, metrics_port=args.metrics_port))
+    except KeyboardInterrupt:
+        pass
+
+    logger.info('Fleet stopped now ...')
+    scheduler.shutdown()
+    logger.info('Scheduler has been deactivated ...')
+    close_apps(apps)
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+import threading
+
+class FrameCache(object):
+    def __init__(self, maxsize=512, name=''):
+        # the name tells the shared caches apart in the metrics, without exposing their key and salt
+        self.name = name
+        self.__static = {}
+        self.__recent = OrderedDict()
+        self.__maxsize = maxsize
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, message, encode, static=False):
+        # static frames never change for a key/salt pair, parameterised ones live in a bounded LRU,
+        # a miss is encoded by the calling bot, so the cache holds no reference to any bot
+        with self.__lock:
+            if static and key in self.__static:
+                self.hits += 1
+                return self.__static[key]
+            if not static and key in self.__recent:
+                self.hits += 1
+                self.__recent.move_to_end(key)
+                return self.__recent[key]
+            self.misses += 1
+
+        frame = encode(message)
+
+        with self.__lock:
+            if static:
+                self.__static[key] = frame
+            else:
+                self.__recent[key] = frame
+                if len(self.__recent) > self.__maxsize:
+                    self.__recent.popitem(last=False)
+        return frame
+
+    def stats(self):
+        with self.__lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'static': len(self.__static),
+                'recent': len(self.__recent),
+            }
+
+    def collect(self):
+        labels = {'cache': self.name}
+        stats = self.stats()
+        yield 'autopvp_frame_cache_hits_total', 'counter', labels, stats['hits']
+        yield 'autopvp_frame_cache_misses_total', 'counter', labels, stats['misses']
+        yield 'autopvp_frame_cache_entries', 'gauge', labels, stats['static'] + stats['recent']
+
+_frame_caches = {}
+_frame_caches_lock = threading.Lock()
+
+def get_frame_cache(key, salt):
+    # bots sharing a key and salt produce identical frames, so they can share one cache
+    with _frame_caches_lock:
+        if (key, salt) not in _frame_caches:
+            _frame_caches[(key, salt)] = FrameCache(name=str(len(_frame_caches)))
+        return _frame_caches[(key, salt)]
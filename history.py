@@ -0,0 +1,98 @@
+from log import logger
+import hashlib
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+WINNER_BOT, WINNER_OPPONENT, WINNER_OTHER = range(0, 3)
+
+# one finished game per record, little endian and packed so the file can be memory-mapped as is
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('opponent', '<u8'),
+    ('row', '<u2'),
+    ('column', '<u2'),
+    ('mines', '<u2'),
+    ('bv', '<u2'),
+    ('op', '<u2'),
+    ('is', '<u2'),
+    ('opponent_solved_bv', '<u2'),
+    ('winner', 'u1'),
+    ('padding', 'u1'),
+    ('bot_bvs', '<f4'),
+    ('finish_time', '<f4'), # NaN for a game that ended before it started
+    ('level_before', '<f4'),
+    ('level_after', '<f4'),
+])
+
+def hash_uid(uid):
+    return int.from_bytes(hashlib.blake2b(str(uid).encode(), digest_size=8).digest(), 'little')
+
+class GameHistoryWriter(object):
+    def __init__(self, path, batch_size=64, flush_interval=5.0):
+        self.__path = path
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__batch = []
+        self.__last_flush = time.monotonic()
+        self.__queue = queue.SimpleQueue()
+        self.__thread = threading.Thread(target=self.__write, name='history-writer', daemon=True)
+        self.__thread.start()
+
+    def append(self, opponent_uid, size, bv, op, islands, opponent_solved_bv, winner, bot_bvs, finish_time, level_before, level_after):
+        row, column, mines = size
+        self.__batch.append((time.time(), hash_uid(opponent_uid), row, column, mines, bv, op, islands, opponent_solved_bv, winner, 0, bot_bvs, finish_time, level_before, level_after))
+        if len(self.__batch) >= self.__batch_size or time.monotonic() - self.__last_flush >= self.__flush_interval:
+            self.flush()
+
+    def flush(self):
+        # the batch is handed over to the writer thread, the caller never waits for the disk
+        if self.__batch:
+            self.__queue.put(np.array(self.__batch, dtype=RECORD_DTYPE).tobytes())
+            self.__batch = []
+        self.__last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def __write(self):
+        with open(self.__path, 'ab') as f:
+            while True:
+                chunk = self.__queue.get()
+                if chunk is None:
+                    return
+                try:
+                    f.write(chunk)
+                    f.flush()
+                except OSError as e:
+                    logger.error('Failed to write the game history: %s', e)
+
+class GameHistoryReader(object):
+    def __init__(self, path):
+        # a torn record at the end of a file that is still being written is left out
+        count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,)) if count else np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def win_rate_by_difficulty(self):
+        records = self.records
+        sizes = np.stack([records['row'], records['column'], records['mines']], axis=1)
+        unique_sizes, inverse = np.unique(sizes, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        games = np.bincount(inverse, minlength=len(unique_sizes))
+        wins = np.bincount(inverse, weights=records['winner'] == WINNER_BOT, minlength=len(unique_sizes))
+        return {tuple(int(value) for value in size): (int(games[index]), float(wins[index] / games[index])) for index, size in enumerate(unique_sizes)}
+
+    def level_drift_by_opponent(self):
+        records = self.records
+        opponents, inverse = np.unique(records['opponent'], return_inverse=True)
+        inverse = inverse.ravel()
+        games = np.bincount(inverse, minlength=len(opponents))
+        drift = np.bincount(inverse, weights=records['level_after'].astype(np.float64) - records['level_before'], minlength=len(opponents))
+        return opponents, games, drift
@@ -0,0 +1,63 @@
+from log import logger
+from collections import OrderedDict
+import json
+import os
+import threading
+
+class LevelMemory(object):
+    def __init__(self, path='', capacity=4096):
+        self.__path = path
+        self.__capacity = capacity
+        self.__lock = threading.Lock()
+        self.__levels = OrderedDict()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__levels)
+
+    def get(self, uid):
+        # returns (level, inc_factor, dec_factor) learned for the opponent, or None
+        with self.__lock:
+            if uid not in self.__levels:
+                return None
+            self.__levels.move_to_end(uid)
+            return tuple(self.__levels[uid])
+
+    def put(self, uid, level, inc_factor, dec_factor):
+        with self.__lock:
+            self.__levels[uid] = [level, inc_factor, dec_factor]
+            self.__levels.move_to_end(uid)
+            while len(self.__levels) > self.__capacity:
+                self.__levels.popitem(last=False)
+
+    def load(self):
+        with open(self.__path, 'r') as f:
+            snapshot = json.load(f)
+        with self.__lock:
+            # the snapshot is ordered from the least to the most recently used opponent
+            self.__levels = OrderedDict((uid, values) for uid, values in snapshot[-self.__capacity:])
+        logger.info('Loaded %d opponents from the level memory ...', len(self.__levels))
+
+    def save(self):
+        if not self.__path:
+            return
+        with self.__lock:
+            snapshot = [[uid, values] for uid, values in self.__levels.items()]
+        temp_path = self.__path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(temp_path, self.__path)
+        logger.info('Saved %d opponents to the level memory ...', len(snapshot))
+
+_level_memories = {}
+_level_memories_lock = threading.Lock()
+
+def get_level_memory(path='', capacity=4096):
+    # shared like the quota store, the first bot to open a path sets its capacity
+    with _level_memories_lock:
+        path = os.path.abspath(path) if path else ''
+        if path not in _level_memories:
+            _level_memories[path] = LevelMemory(path, capacity)
+        return _level_memories[path]
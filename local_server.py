@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+from benchmark import generate_cells
+from board import get_board, get_board_result
+from log import logger
+from stats import LatencyStats
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+from aiohttp import web
+import aiohttp
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import sys
+import time
+
+SIZES = {
+    1: (8, 8, 10),
+    2: (16, 16, 40),
+    3: (30, 16, 99),
+    4: (16, 30, 99),
+}
+
+class ServerStats(object):
+    def __init__(self):
+        self.started = time.time()
+        self.connections = 0
+        self.received = 0
+        self.sent = 0
+        self.games = 0
+        self.bot_wins = 0
+        self.game_latency = LatencyStats()
+
+    def summary(self):
+        elapsed = time.time() - self.started
+        return {
+            'elapsed': elapsed,
+            'connections': self.connections,
+            'received': self.received,
+            'sent': self.sent,
+            'received_per_sec': self.received / elapsed,
+            'sent_per_sec': self.sent / elapsed,
+            'games': self.games,
+            'bot_wins': self.bot_wins,
+            'game_latency': self.game_latency.summary(),
+        }
+
+class BotSession(object):
+    def __init__(self, ws, uid, args, stats, rng):
+        self.__ws = ws
+        self.__uid = uid
+        self.__args = args
+        self.__stats = stats
+        self.__rng = rng
+        self.__AES = AES.new(args.key.encode(), AES.MODE_ECB)
+        self.__tasks = set()
+        self.__opponent = None
+        self.__mode = 2
+        self.__cells = ''
+        self.__bv = 0
+        self.__info_time = 0
+        self.__gaming = False
+
+    def encode(self, message):
+        ready = json.dumps(message, separators=(',', ':'))
+        encrypted = self.__AES.encrypt(pad(ready.encode(), AES.block_size)).hex().upper()
+        return hashlib.md5((encrypted + self.__args.salt).encode()).hexdigest() + encrypted
+
+    def decode(self, data):
+        return json.loads(unpad(self.__AES.decrypt(bytes.fromhex(data[32:])), AES.block_size))
+
+    async def send(self, message):
+        if not self.__ws.closed:
+            self.__stats.sent += 1
+            await self.__ws.send_str(self.encode(message))
+
+    def later(self, delay, func, *args):
+        async def delayed():
+            await asyncio.sleep(delay)
+            await func(*args)
+        task = asyncio.ensure_future(delayed())
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    def close(self):
+        for task in list(self.__tasks):
+            task.cancel()
+
+    def __user(self, uid, vip=False, level=3):
+        return {'pvp': {'uid': uid}, 'user': {'timingLevel': level, 'vip': vip}}
+
+    def __room(self, gaming=False):
+        users = [self.__user(self.__opponent['uid'])] if self.__opponent else []
+        users.append(self.__user(self.__uid))
+        row, column, mines = SIZES[self.__mode]
+        return {
+            'userIdList': [user['pvp']['uid'] for user in users],
+            'users': users,
+            'expired': False,
+            'gaming': gaming,
+            'coin': 0,
+            'password': '',
+            'minesweeperAutoOpen': True,
+            'minesweeperFlagForbidden': False,
+            'round': 1,
+            'maxNumber': 2,
+            'row': row,
+            'column': column,
+            'mine': mines,
+        }
+
+    async def __opponent_enter(self):
+        uid = str(self.__rng.randrange(10 ** 6, 10 ** 7))
+        bvs = self.__args.opponent_bvs or self.__rng.lognormvariate(0.0, 0.5)
+        self.__opponent = {'uid': uid, 'bvs': bvs}
+        await self.send({'url': 'pvp/room/enter/event', 'user': self.__user(uid)})
+        await self.send({'url': 'pvp/room/update', 'room': self.__room()})
+
+    async def __opponent_ready(self):
+        if self.__opponent and not self.__gaming:
+            await self.send({'url': 'pvp/room/ready', 'uid': self.__opponent['uid'], 'ready': True})
+
+    async def __opponent_solve(self, opponent, bv):
+        # the opponent solves one bv at a time at its own speed, after the preparation window
+        await asyncio.sleep(self.__args.prepare)
+        for solved in range(1, bv + 1):
+            await asyncio.sleep(self.__rng.expovariate(opponent['bvs']))
+            if not self.__gaming or self.__opponent is not opponent:
+                return
+            await self.send({'url': 'pvp/minesweeper/progress', 'uid': opponent['uid'], 'bv': solved})
+        await self.__finish(opponent['uid'])
+
+    async def __finish(self, winner_uid):
+        if not self.__gaming:
+            return
+        self.__gaming = False
+        self.__stats.games += 1
+        self.__stats.bot_wins += winner_uid == self.__uid
+        self.__stats.game_latency.record(time.time() - self.__info_time)
+        await self.send({'url': 'pvp/minesweeper/win', 'users': [self.__user(winner_uid)]})
+        await self.send({'url': 'pvp/room/update', 'room': self.__room()})
+        self.later(self.__args.ready_delay, self.__opponent_ready)
+
+    async def noise(self):
+        # lobby broadcasts from other rooms and users, which the bot is expected to discard
+        while not self.__ws.closed:
+            await asyncio.sleep(self.__rng.expovariate(self.__args.noise))
+            uid = str(self.__rng.randrange(10 ** 6, 10 ** 7))
+            if self.__rng.random() < 0.5:
+                await self.send({'url': 'pvp/minesweeper/progress', 'uid': uid, 'bv': self.__rng.randint(1, 100)})
+            else:
+                await self.send({'url': 'pvp/user/online', 'uid': uid, 'offline': self.__rng.random() < 0.5})
+
+    async def handle(self, message):
+        url = message.get('url')
+        if url == 'enter':
+            await self.send({'url': 'pvp/enter'})
+        elif url in ('room/minesweeper/create', 'room/minesweeper/edit'):
+            self.__mode = {(8, 8, 10): 1, (30, 16, 99): 3, (16, 30, 99): 4}.get((message['row'], message['column'], message['mine']), 2)
+            await self.send({'url': 'pvp/room/update', 'room': self.__room()})
+            if self.__opponent is None:
+                self.later(self.__args.enter_delay, self.__opponent_enter)
+        elif url == 'room/ready':
+            if message['ready']:
+                self.later(self.__args.ready_delay, self.__opponent_ready)
+        elif url == 'room/start':
+            self.__gaming = True
+            await self.send({'url': 'pvp/room/update', 'room': self.__room(gaming=True)})
+        elif url == 'minesweeper/info':
+            row, column, mines = SIZES[self.__mode]
+            self.__cells = generate_cells(row, column, mines, self.__rng)
+            self.__bv = get_board_result(get_board(self.__cells.split('-')[0: -1]))['bv']
+            self.__info_time = time.time()
+            await self.send({'url': 'pvp/minesweeper/info', 'cells': [self.__cells]})
+            self.later(0, self.__opponent_solve, self.__opponent, self.__bv)
+        elif url == 'minesweeper/progress':
+            await self.send({'url': 'pvp/minesweeper/progress', 'uid': self.__uid, 'bv': message['bv']})
+        elif url == 'minesweeper/success':
+            await self.__finish(self.__uid)
+        elif url == 'room/message':
+            await self.send({'url': 'pvp/room/message', 'msg': {'user': {'uid': self.__uid}, 'message': message['msg']}})
+        elif url == 'room/kick':
+            if self.__opponent and self.__opponent['uid'] == message['uid']:
+                await self.send({'url': 'pvp/room/exit/event', 'user': self.__user(message['uid'])})
+                self.__opponent = None
+                await self.send({'url': 'pvp/room/update', 'room': self.__room()})
+                self.later(self.__args.enter_delay, self.__opponent_enter)
+        elif url == 'room/exit':
+            self.__gaming = False
+            self.__opponent = None
+            await self.send({'url': 'pvp/room/exit'})
+
+def make_app(args):
+    stats = ServerStats()
+    rng = random.Random(args.seed)
+
+    async def socket(request):
+        ws = web.WebSocketResponse(heartbeat=10.0)
+        await ws.prepare(request)
+        stats.connections += 1
+        session = BotSession(ws, request.match_info['uid'], args, stats, random.Random(rng.random()))
+        noise = asyncio.ensure_future(session.noise()) if args.noise > 0 else None
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    stats.received += 1
+                    await session.handle(session.decode(msg.data))
+        finally:
+            stats.connections -= 1
+            session.close()
+            if noise is not None:
+                noise.cancel()
+        return ws
+
+    async def report(request):
+        return web.json_response(stats.summary())
+
+    app = web.Application()
+    app.router.add_get('/Minesweeper/socket/pvp/{uid}', socket)
+    app.router.add_get('/stats', report)
+    app['stats'] = stats
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for the minesweeper war pvp websocket server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--key', required=True, help='the AES key shared with the bots')
+    parser.add_argument('--salt', required=True, help='the hash salt shared with the bots')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--prepare', type=float, default=6.0, help='seconds before the opponent starts solving')
+    parser.add_argument('--enter-delay', type=float, default=1.0, help='seconds before an opponent enters a new room')
+    parser.add_argument('--ready-delay', type=float, default=1.0, help='seconds before the opponent gets ready')
+    parser.add_argument('--opponent-bvs', type=float, default=0.0, help='fixed opponent speed, random when 0')
+    parser.add_argument('--noise', type=float, default=0.0, help='lobby broadcasts per second per connection')
+    parser.add_argument('--report', type=float, default=10.0, help='seconds between stats reports')
+    args = parser.parse_args(argv)
+
+    app = make_app(args)
+
+    async def reporter(app):
+        async def loop():
+            while True:
+                await asyncio.sleep(args.report)
+                logger.info('Local server stats: %s', app['stats'].summary())
+        task = asyncio.ensure_future(loop())
+        yield
+        task.cancel()
+
+    app.cleanup_ctx.append(reporter)
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,24 +1,62 @@
+import atexit
+import itertools
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 import time
 
+# the pipeline can be tuned from the environment, as this module is imported before any configuration
+LOG_DIR = os.environ.get('AUTOPVP_LOG_DIR', 'log')
+LOG_MAX_BYTES = int(os.environ.get('AUTOPVP_LOG_MAX_BYTES', 16 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('AUTOPVP_LOG_BACKUP_COUNT', 8))
+LOG_ROTATE_WHEN = os.environ.get('AUTOPVP_LOG_ROTATE_WHEN', '') # e.g. 'midnight' or 'h', rotates by time instead of size
+LOG_FRAME_SAMPLE = int(os.environ.get('AUTOPVP_LOG_FRAME_SAMPLE', 1)) # keep one frame log out of every N
+
 run_time = time.time()
 time_sec = time.strftime('%Y-%m-%d-%H-%M-%S', time.localtime(run_time))
 time_msec = '%03d' % ((run_time - int(run_time)) * 1000)
 file_time_tag = time_sec + '-' + time_msec
 
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # records are formatted by the writer thread, not by the thread that logs them
+        return record
+
+class SampleFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.__rate = max(1, rate)
+        self.__counter = itertools.count()
+
+    def filter(self, record):
+        return next(self.__counter) % self.__rate == 0
+
+formatter = logging.Formatter('[%(asctime)s %(name)s] %(levelname)s: %(message)s')
+
 logger = logging.getLogger('autopvp')
 logger.setLevel(logging.DEBUG)
 
+# raw frames are logged through a child logger, so they can be sampled without touching other records
+frame_logger = logger.getChild('frame')
+frame_logger.addFilter(SampleFilter(LOG_FRAME_SAMPLE))
+
 stream_handler = logging.StreamHandler(sys.stdout)
-stream_handler.setFormatter(
-    logging.Formatter('[%(asctime)s %(name)s] %(levelname)s: %(message)s'))
+stream_handler.setFormatter(formatter)
 stream_handler.setLevel(logging.DEBUG)
-logger.addHandler(stream_handler)
 
-file_handler = logging.FileHandler(os.path.join('log', 'autopvp(%s).log' % (file_time_tag)))
-file_handler.setFormatter(
-    logging.Formatter('[%(asctime)s %(name)s] %(levelname)s: %(message)s'))
+os.makedirs(LOG_DIR, exist_ok=True)
+file_path = os.path.join(LOG_DIR, 'autopvp(%s).log' % (file_time_tag))
+if LOG_ROTATE_WHEN:
+    file_handler = logging.handlers.TimedRotatingFileHandler(file_path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+else:
+    file_handler = logging.handlers.RotatingFileHandler(file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+file_handler.setFormatter(formatter)
 file_handler.setLevel(logging.WARNING)
-logger.addHandler(file_handler)
+
+log_queue = queue.SimpleQueue()
+logger.addHandler(LazyQueueHandler(log_queue))
+listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
@@ -0,0 +1,84 @@
+from log import logger
+from aiohttp import web
+import asyncio
+import bisect
+
+TIME_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+class Histogram(object):
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+class LoopLagMonitor(object):
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.histogram = Histogram()
+
+    async def run(self):
+        # a callback scheduled for now + interval that fires late shows how busy the loop is
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - expected)
+            self.histogram.observe(self.lag)
+
+    def collect(self):
+        yield 'autopvp_event_loop_lag_seconds', 'gauge', {}, self.lag
+        yield 'autopvp_event_loop_lag_histogram_seconds', 'histogram', {}, self.histogram
+
+def format_labels(labels, extra=None):
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in items)
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self.__collectors = []
+
+    def register(self, collector):
+        self.__collectors.append(collector)
+
+    def render(self):
+        # collectors yield (name, type, labels, value), samples are grouped by name for the text format
+        families = {}
+        for collector in self.__collectors:
+            for name, kind, labels, value in collector():
+                families.setdefault(name, (kind, []))[1].append((labels, value))
+
+        lines = []
+        for name, (kind, samples) in families.items():
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, value in samples:
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        lines.append('%s_bucket%s %d' % (name, format_labels(labels, ('le', bound)), cumulative))
+                    lines.append('%s_sum%s %r' % (name, format_labels(labels), value.total))
+                    lines.append('%s_count%s %d' % (name, format_labels(labels), value.count))
+                else:
+                    lines.append('%s%s %r' % (name, format_labels(labels), float(value)))
+        return '\n'.join(lines) + '\n'
+
+async def start_metrics_server(registry, host='127.0.0.1', port=9108):
+    async def handle(request):
+        return web.Response(body=registry.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info('Metrics are served on http://%s:%d/metrics ...', host, port)
+    return runner
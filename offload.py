@@ -0,0 +1,97 @@
+from log import logger
+from metrics import Histogram
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import threading
+import time
+
+class Offloader(object):
+    def __init__(self, kind='', workers=None, max_pending=64, timeout=2.0):
+        # kind is 'process', 'thread', or '' to run everything inline on the calling thread
+        self.kind = kind
+        self.__workers = workers
+        self.__max_pending = max_pending
+        self.__timeout = timeout
+        self.__executor = self.__create_executor()
+        self.pending = 0
+        self.counters = {'offloaded': 0, 'inline': 0, 'rejected': 0, 'timeouts': 0, 'broken': 0}
+        self.task_time = Histogram()
+
+    def __create_executor(self):
+        if self.kind == 'process':
+            return ProcessPoolExecutor(self.__workers)
+        elif self.kind == 'thread':
+            return ThreadPoolExecutor(self.__workers, thread_name_prefix='offload')
+        return None
+
+    def __rebuild(self, executor):
+        # a pool that lost a worker fails every later task, so it is replaced once by whichever call notices first
+        if self.__executor is executor:
+            logger.warning('The %s pool is broken, rebuilding it ...', self.kind)
+            executor.shutdown(wait=False)
+            self.__executor = self.__create_executor()
+
+    def __release(self, future):
+        # a task holds its pool slot until the pool is done with it, even when its caller gave up waiting
+        self.pending -= 1
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, func, *args):
+        # a full queue or a broken pool runs the task inline, a slow pool runs it inline after waiting for the timeout
+        if self.__executor is None:
+            self.counters['inline'] += 1
+            return func(*args)
+        if self.pending >= self.__max_pending:
+            self.counters['rejected'] += 1
+            return func(*args)
+
+        executor = self.__executor
+        started = time.perf_counter()
+        try:
+            try:
+                future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+            except BrokenExecutor:
+                self.counters['broken'] += 1
+                self.__rebuild(executor)
+                return func(*args)
+            self.pending += 1
+            future.add_done_callback(self.__release)
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self.__timeout)
+            except asyncio.TimeoutError:
+                # a task still waiting in the queue is withdrawn, so it does not run twice
+                future.cancel()
+                self.counters['timeouts'] += 1
+                logger.warning('Offloaded %s timed out, running it inline ...', getattr(func, '__name__', func))
+                return func(*args)
+            except BrokenExecutor:
+                self.counters['broken'] += 1
+                self.__rebuild(executor)
+                logger.warning('Offloaded %s lost its worker, running it inline ...', getattr(func, '__name__', func))
+                return func(*args)
+            self.counters['offloaded'] += 1
+            return result
+        finally:
+            self.task_time.observe(time.perf_counter() - started)
+
+    def collect(self):
+        labels = {'kind': self.kind or 'inline'}
+        for name, value in self.counters.items():
+            yield 'autopvp_offload_%s_total' % name, 'counter', labels, value
+        yield 'autopvp_offload_pending', 'gauge', labels, self.pending
+        yield 'autopvp_offload_seconds', 'histogram', labels, self.task_time
+
+    def shutdown(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+
+_offloaders = {}
+_offloaders_lock = threading.Lock()
+
+def get_offloader(kind=''):
+    # one pool per kind is shared by every bot in a process
+    with _offloaders_lock:
+        if kind not in _offloaders:
+            _offloaders[kind] = Offloader(kind)
+        return _offloaders[kind]
@@ -0,0 +1,131 @@
+from bitboard import BitBoard, popcount
+from log import logger
+import asyncio
+import random
+import time
+
+# relative costs of a click plan, fitted to the estimated finish time afterwards
+OPENING_COST = 0.35 # an opening is one click that needs little thinking
+ISOLATED_COST = 1.0
+BURST_GAP = 0.8 # looking for the next place to click
+JITTER = 0.3
+MAX_BURST = 6
+
+def uniform_schedule(bv, bvs):
+    # progress k is reported (k - 1) / bvs seconds after the battle starts
+    return [((step - 1) / bvs, step) for step in range(1, bv + 1)], bv / bvs
+
+def plan_schedule(board, bvs, rng=None):
+    # openings are clicked quickly, each island is solved in bursts of isolated bv, and one progress is sent per burst
+    rng = rng or random.Random()
+    bitboard = BitBoard(board)
+    opened = 0
+    openings = 0
+    for zeros, cells in bitboard.openings():
+        opened |= cells
+        openings += 1
+    island_sizes = [popcount(island) for island in bitboard.components(bitboard.mask & ~bitboard.mines & ~opened)]
+    bv = openings + sum(island_sizes)
+
+    segments = [(OPENING_COST, 1)] * openings
+    for size in island_sizes:
+        while size > 0:
+            burst = min(size, rng.randint(1, MAX_BURST))
+            segments.append((ISOLATED_COST, burst))
+            size -= burst
+    rng.shuffle(segments)
+    if openings:
+        # the first click of a human is almost always on an opening
+        first = segments.index((OPENING_COST, 1))
+        segments[0], segments[first] = segments[first], segments[0]
+
+    bursts = []
+    current_cost, current_bv = 0, 0
+    for cost, count in segments:
+        current_cost += cost * count * rng.uniform(1 - JITTER, 1 + JITTER)
+        current_bv += count
+        # consecutive openings are merged into one burst
+        if cost == OPENING_COST and current_bv < MAX_BURST:
+            continue
+        bursts.append((current_cost + BURST_GAP * rng.uniform(1 - JITTER, 1 + JITTER), current_bv))
+        current_cost, current_bv = 0, 0
+    if current_bv:
+        bursts.append((current_cost + BURST_GAP, current_bv))
+
+    finish = bv / bvs
+    total_cost = sum(cost for cost, count in bursts) + ISOLATED_COST
+    scale = finish / total_cost
+    steps = []
+    elapsed, solved_bv = 0, 0
+    for cost, count in bursts:
+        elapsed += cost
+        solved_bv += count
+        steps.append((elapsed * scale, solved_bv))
+    return steps, finish
+
+def cells_schedule(cells, bvs):
+    return plan_schedule(cells.split('-')[0: -1], bvs)
+
+class GamePacer(object):
+    def __init__(self, send_progress, send_success):
+        self.__send_progress = send_progress
+        self.__send_success = send_success
+        self.__task = None
+        self.__steps = []
+        self.__finish = 0
+        self.__total = 0
+        self.__started = 0
+        self.__started_time = 0
+
+    @property
+    def started_time(self):
+        return self.__started_time
+
+    @property
+    def active(self):
+        return self.__total > 0
+
+    def start(self, steps, finish, delay):
+        self.cancel()
+        loop = asyncio.get_running_loop()
+        self.__steps = steps
+        self.__finish = finish
+        self.__total = steps[-1][1] if steps else 0
+        self.__started = loop.time() + delay
+        self.__started_time = time.time() + delay
+        logger.info('The pacer is scheduled to finish %d bv in %.3f seconds ...', self.__total, finish)
+
+    def advance(self, solved_bv):
+        if not self.active:
+            return
+        if solved_bv >= self.__total:
+            self.__schedule(self.__finish, self.__success)
+            return
+        for offset, bv in self.__steps:
+            if bv > solved_bv:
+                self.__schedule(offset, self.__send_progress, bv)
+                return
+
+    def cancel(self):
+        if self.__task is not None and not self.__task.done():
+            self.__task.cancel()
+            logger.info('The pacer has been cancelled ...')
+        self.__task = None
+        self.__total = 0
+
+    def __schedule(self, offset, func, *args):
+        if self.__task is not None and not self.__task.done():
+            self.__task.cancel()
+        self.__task = asyncio.ensure_future(self.__emit(self.__started + offset, func, *args))
+
+    async def __emit(self, deadline, func, *args):
+        # sleep towards an absolute deadline, so slow sends and late echoes do not accumulate drift
+        delay = deadline - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await func(*args)
+
+    async def __success(self):
+        finished_time = time.time()
+        self.__total = 0
+        await self.__send_success(finished_time, finished_time - self.__started_time)
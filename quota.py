@@ -0,0 +1,104 @@
+from log import logger
+import json
+import os
+import threading
+import time
+
+ORIGINAL, LEFT, EPOCH, LAST_SEEN = range(0, 4)
+
+class QuotaStore(object):
+    def __init__(self, path='', idle_hours=24):
+        self.__path = path
+        self.__idle_seconds = idle_hours * 3600
+        self.__lock = threading.RLock()
+        self.__entries = {}
+        self.__generation = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    def __epoch(self):
+        # every hour and every manual reset moves the epoch forward, entries from older epochs are full again
+        return int(time.time() // 3600) + self.__generation
+
+    def __lookup(self, uid):
+        entry = self.__entries[uid]
+        epoch = self.__epoch()
+        if entry[EPOCH] != epoch:
+            entry[LEFT] = entry[ORIGINAL]
+            entry[EPOCH] = epoch
+        entry[LAST_SEEN] = time.time()
+        return entry
+
+    def __contains__(self, uid):
+        with self.__lock:
+            return uid in self.__entries
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    def register(self, uid, original):
+        with self.__lock:
+            if uid not in self.__entries:
+                self.__entries[uid] = [original, original, self.__epoch(), time.time()]
+
+    def left(self, uid):
+        with self.__lock:
+            return self.__lookup(uid)[LEFT]
+
+    def consume(self, uid):
+        with self.__lock:
+            entry = self.__lookup(uid)
+            entry[LEFT] -= 1
+            return entry[LEFT]
+
+    def reset(self):
+        with self.__lock:
+            self.__generation += 1
+
+    def evict_idle(self):
+        with self.__lock:
+            deadline = time.time() - self.__idle_seconds
+            idle_users = [uid for uid, entry in self.__entries.items() if entry[LAST_SEEN] < deadline]
+            for uid in idle_users:
+                del self.__entries[uid]
+        return len(idle_users)
+
+    def snapshot(self):
+        with self.__lock:
+            return {
+                'generation': self.__generation,
+                'entries': {uid: list(entry) for uid, entry in self.__entries.items()},
+            }
+
+    def load(self):
+        with open(self.__path, 'r') as f:
+            snapshot = json.load(f)
+        with self.__lock:
+            self.__generation = snapshot['generation']
+            self.__entries = snapshot['entries']
+        logger.info('Loaded %d users from the quota store ...', len(self.__entries))
+
+    def save(self):
+        # called every hour, so idle users are evicted even when nothing is written
+        evicted = self.evict_idle()
+        if not self.__path:
+            logger.info('%d idle users evicted from the quota store ...', evicted)
+            return
+        snapshot = self.snapshot()
+        temp_path = self.__path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(temp_path, self.__path)
+        logger.info('Saved %d users to the quota store, %d idle users evicted ...', len(snapshot['entries']), evicted)
+
+_quota_stores = {}
+_quota_stores_lock = threading.Lock()
+
+def get_quota_store(path=''):
+    # every bot in a process shares the quota of an opponent, and one writer per file, for the same path
+    with _quota_stores_lock:
+        path = os.path.abspath(path) if path else ''
+        if path not in _quota_stores:
+            _quota_stores[path] = QuotaStore(path)
+        return _quota_stores[path]
@@ -0,0 +1,69 @@
+from log import frame_logger, logger
+import hashlib
+import json
+import re
+
+URL_PATTERN = re.compile(rb'"url"\s*:\s*"([^"]*)"')
+
+# frames of these urls only matter when one of the listed parties is mentioned
+UID_FILTERS = {
+    'pvp/minesweeper/progress': (True, True),
+    'pvp/user/online': (False, True),
+    'pvp/room/ready': (False, True),
+    'pvp/room/exit/event': (False, True),
+    'pvp/room/message': (False, True),
+    'pvp/room/user/exit': (False, True),
+}
+
+class ReceivePipeline(object):
+    def __init__(self, decrypt, salt, uid, handled_urls, verify_hash=True, wire=None):
+        self.__decrypt = decrypt
+        self.__wire = wire
+        self.__salt = salt
+        self.__uid_token = ('"%s"' % uid).encode()
+        self.__handled_urls = frozenset(handled_urls)
+        self.__verify_hash = verify_hash
+        self.counters = {
+            'received': 0,
+            'hash_mismatch': 0,
+            'dropped_url': 0,
+            'dropped_uid': 0,
+            'decoded': 0,
+        }
+
+    def decode(self, data, opponent_uid=''):
+        self.counters['received'] += 1
+        payload = data[32:]
+        if self.__verify_hash and hashlib.md5((payload + self.__salt).encode()).hexdigest() != data[0: 32].lower():
+            self.counters['hash_mismatch'] += 1
+            logger.warning('Dropping a frame with mismatched hash ...')
+            return None
+
+        decrypt_message = self.__decrypt(bytes.fromhex(payload))
+
+        # a single top-level url can be read without decoding the whole payload
+        urls = URL_PATTERN.findall(decrypt_message)
+        if len(urls) == 1:
+            url = urls[0].decode()
+            if self.__wire is not None:
+                self.__wire.record('in', url, data, len(decrypt_message))
+            if url not in self.__handled_urls:
+                self.counters['dropped_url'] += 1
+                return None
+            if url in UID_FILTERS and not self.__mentions(decrypt_message, opponent_uid, *UID_FILTERS[url]):
+                self.counters['dropped_uid'] += 1
+                return None
+
+        text_message = json.loads(decrypt_message)
+        if len(urls) != 1 and self.__wire is not None:
+            self.__wire.record('in', text_message.get('url', '') if isinstance(text_message, dict) else '', data, len(decrypt_message))
+        self.counters['decoded'] += 1
+        frame_logger.debug('[Recv][<-]: %s', text_message)
+        return text_message
+
+    def __mentions(self, decrypt_message, opponent_uid, by_self, by_opponent):
+        if by_self and self.__uid_token in decrypt_message:
+            return True
+        if by_opponent and opponent_uid and ('"%s"' % opponent_uid).encode() in decrypt_message:
+            return True
+        return False
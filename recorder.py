@@ -0,0 +1,51 @@
+import string
+import struct
+import time
+
+# timestamp, payload length, flags
+RECORD_HEADER = struct.Struct('<dIB')
+FLAG_HEX = 1
+FLAG_UPPER = 2
+HEX_DIGITS = frozenset(string.hexdigits)
+
+class FrameRecorder(object):
+    def __init__(self, path):
+        self.__file = open(path, 'ab')
+        self.frames = 0
+
+    def record(self, data, timestamp=None):
+        # frames are hex text, storing them as raw bytes halves the size of a recording
+        timestamp = time.time() if timestamp is None else timestamp
+        prefix, payload = data[0: 32], data[32:]
+        flags = 0
+        if len(data) % 2 == 0 and HEX_DIGITS.issuperset(data) and prefix == prefix.lower() and (payload == payload.upper() or payload == payload.lower()):
+            flags = FLAG_HEX | (FLAG_UPPER if payload == payload.upper() else 0)
+            raw = bytes.fromhex(data)
+        else:
+            raw = data.encode()
+        self.__file.write(RECORD_HEADER.pack(timestamp, len(raw), flags))
+        self.__file.write(raw)
+        self.frames += 1
+
+    def flush(self):
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+def read_frames(path):
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, length, flags = RECORD_HEADER.unpack(header)
+            raw = f.read(length)
+            if len(raw) < length:
+                return # a torn record at the end of a recording that is still being written
+            if flags & FLAG_HEX:
+                payload = raw[16:].hex()
+                data = raw[0: 16].hex() + (payload.upper() if flags & FLAG_UPPER else payload)
+            else:
+                data = raw.decode()
+            yield timestamp, data
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+from autopvp import AutoPVPApp
+from log import logger
+from recorder import read_frames
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import sys
+import time
+import traceback
+import types
+
+class CaptureSocket(object):
+    def __init__(self):
+        self.sent = []
+
+    async def send_str(self, data):
+        self.sent.append(data)
+
+def load_config(name):
+    # the replayed app must never record what it replays
+    module = importlib.import_module(name)
+    config = types.SimpleNamespace(**{key: value for key, value in vars(module).items() if not key.startswith('_')})
+    config.record_path = ''
+    return config
+
+async def replay(app, frames):
+    ws = CaptureSocket()
+    app.attach(ws)
+    reconnects = 0
+    errors = []
+    started = time.perf_counter()
+    try:
+        for index, (timestamp, data) in enumerate(frames):
+            try:
+                alive = await app.feed(data)
+            except Exception:
+                logger.error('Frame %d recorded at %.3f failed:\n%s', index, timestamp, traceback.format_exc())
+                errors.append(index)
+                alive = False
+            if not alive:
+                await app.drain()
+                # the live bot would reconnect here, so the replay starts a fresh session as well
+                reconnects += 1
+                app.attach(ws)
+    finally:
+        await app.drain()
+        app.detach()
+    elapsed = time.perf_counter() - started
+    return {
+        'frames': len(frames),
+        'elapsed': elapsed,
+        'frames_per_sec': len(frames) / elapsed if elapsed > 0 else float('inf'),
+        'sent': len(ws.sent),
+        'reconnects': reconnects,
+        'errors': errors,
+        'receiver': dict(app.receiver.counters),
+        'handlers': app.handler_stats(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a frame recording through the bot as fast as possible.')
+    parser.add_argument('recording')
+    parser.add_argument('--config', default='account_config', help='account configuration module used while recording')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='keep the bot logging below warnings')
+    parser.add_argument('--output', default='', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    frames = list(read_frames(args.recording))
+    results = []
+    for index in range(0, args.repeat):
+        app = AutoPVPApp(config=load_config(args.config))
+        results.append(asyncio.run(replay(app, frames)))
+        print('Run %d: %d frames in %.3f seconds, %.1f frames/s, %d sent' % (index + 1, results[-1]['frames'], results[-1]['elapsed'], results[-1]['frames_per_sec'], results[-1]['sent']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,113 @@
+from log import logger
+from metrics import Histogram
+import asyncio
+import heapq
+import itertools
+import time
+
+# game frames overtake everything else, the rest keeps its order as the room protocol depends on it
+PRIORITY_GAME, PRIORITY_NORMAL = range(0, 2)
+
+class FrameSender(object):
+    def __init__(self, maxsize=256, wire=None):
+        self.__maxsize = maxsize
+        self.__wire = wire
+        self.__heap = []
+        self.__coalesced = {}
+        self.__sequence = itertools.count()
+        self.__ws = None
+        self.__task = None
+        self.__ready = None
+        self.__space = None
+        self.__idle = None
+        self.counters = {'queued': 0, 'sent': 0, 'coalesced': 0, 'dropped': 0, 'failed': 0, 'backpressure': 0}
+        self.queue_time = Histogram()
+        self.write_time = Histogram()
+
+    def __len__(self):
+        return len(self.__heap)
+
+    def start(self, ws):
+        self.stop()
+        self.__ws = ws
+        self.__ready = asyncio.Event()
+        self.__space = asyncio.Event()
+        self.__idle = asyncio.Event()
+        self.__space.set()
+        self.__idle.set()
+        self.__task = asyncio.ensure_future(self.__write())
+
+    def stop(self):
+        # frames still queued belong to the old connection and are dropped with it
+        if self.__task is not None and not self.__task.done():
+            self.__task.cancel()
+        self.__task = None
+        self.__ws = None
+        self.counters['dropped'] += len(self.__heap)
+        self.__heap = []
+        self.__coalesced = {}
+        if self.__space is not None:
+            self.__space.set()
+
+    async def put(self, message, priority=PRIORITY_NORMAL, coalesce_key=None, url='', size=0):
+        # a bad frame is refused here, in the writer it would only surface as a failed write
+        if not isinstance(message, str):
+            raise TypeError('frames must be str, not %s' % type(message).__name__)
+        # a newer frame with the same key replaces the queued one in place
+        if coalesce_key is not None and coalesce_key in self.__coalesced:
+            entry = self.__coalesced[coalesce_key]
+            entry[3] = message
+            entry[5] = url
+            entry[6] = size
+            self.counters['coalesced'] += 1
+            return
+        while self.__task is not None and len(self.__heap) >= self.__maxsize:
+            self.counters['backpressure'] += 1
+            self.__space.clear()
+            await self.__space.wait()
+        if self.__task is None:
+            self.counters['dropped'] += 1
+            return
+        entry = [priority, next(self.__sequence), coalesce_key, message, time.perf_counter(), url, size]
+        heapq.heappush(self.__heap, entry)
+        if coalesce_key is not None:
+            self.__coalesced[coalesce_key] = entry
+        self.counters['queued'] += 1
+        self.__idle.clear()
+        self.__ready.set()
+
+    async def drain(self):
+        if self.__task is not None:
+            await self.__idle.wait()
+
+    async def __write(self):
+        while True:
+            if not self.__heap:
+                self.__idle.set()
+                self.__ready.clear()
+                await self.__ready.wait()
+                continue
+            priority, sequence, coalesce_key, message, queued, url, size = heapq.heappop(self.__heap)
+            if coalesce_key is not None:
+                del self.__coalesced[coalesce_key]
+            self.__space.set()
+            started = time.perf_counter()
+            self.queue_time.observe(started - queued)
+            try:
+                await self.__ws.send_str(message)
+                self.counters['sent'] += 1
+                # only frames that reached the socket count as wire bytes, not replaced or dropped ones
+                if self.__wire is not None:
+                    self.__wire.record('out', url, message, size)
+            except Exception as e:
+                # the reader notices the broken connection, the writer only drops the frame and keeps going
+                self.counters['failed'] += 1
+                logger.warning('Failed to send a frame: %s', e)
+            self.write_time.observe(time.perf_counter() - started)
+
+    def collect(self, labels):
+        for name, value in self.counters.items():
+            yield 'autopvp_send_%s_total' % name, 'counter', labels, value
+        yield 'autopvp_send_queue_depth', 'gauge', labels, len(self.__heap)
+        yield 'autopvp_send_queue_seconds', 'histogram', labels, self.queue_time
+        yield 'autopvp_send_write_seconds', 'histogram', labels, self.write_time
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+from autopvp import AutoPVPApp
+from banlist import BanStore
+from log import logger
+from shared_state import SharedBanSet, SharedQuotaTable
+from supervisor import HEALTHY_AFTER, get_backoff, run_bots
+from apscheduler.schedulers.background import BackgroundScheduler
+import argparse
+import asyncio
+import ctypes
+import importlib
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+# every shard publishes these figures into its own row of a shared array
+LOAD_FIELDS = ('heartbeat', 'bots', 'cpu', 'frames_received', 'frames_sent', 'games_finished')
+HEARTBEAT, BOTS, CPU, FRAMES_RECEIVED, FRAMES_SENT, GAMES_FINISHED = range(0, len(LOAD_FIELDS))
+LOAD_INTERVAL = 1.0
+
+def partition(configs, shards):
+    return [configs[index::shards] for index in range(0, min(shards, len(configs)))]
+
+def get_delta(current, last):
+    # counters start over in a restarted shard
+    return current - last if current >= last else current
+
+def save_states(apps):
+    for app in apps:
+        app.save_state()
+
+def close_apps(apps):
+    for app in apps:
+        app.close()
+
+async def publish_load(apps, load, offset):
+    # only the plain counters are read here, collecting every metric each second would cost more than the figures are worth
+    while True:
+        load[offset + HEARTBEAT] = time.time()
+        load[offset + BOTS] = len(apps)
+        load[offset + CPU] = time.process_time()
+        load[offset + FRAMES_RECEIVED] = sum(app.receiver.counters['received'] for app in apps)
+        load[offset + FRAMES_SENT] = sum(app.counters['frames_sent'] for app in apps)
+        load[offset + GAMES_FINISHED] = sum(app.counters['games_finished'] for app in apps)
+        await asyncio.sleep(LOAD_INTERVAL)
+
+async def run_shard_bots(apps, load, offset, metrics_port):
+    await asyncio.gather(run_bots(apps, metrics_port=metrics_port), publish_load(apps, load, offset))
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_shard(index, config_names, quota, bans, load, metrics_port):
+    # the entry point of a worker process, its bots share the quota table and the ban set with every other shard
+    # a Ctrl+C reaches the whole process group, the shards only stop when the launcher terminates them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, interrupt)
+    apps = [AutoPVPApp(config=importlib.import_module(name), quota=quota, bans=bans) for name in config_names]
+    logger.info('Shard %d has been loaded with %d bots ...', index, len(apps))
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(func=save_states, args=(apps,), trigger='cron', hour='*', misfire_grace_time=30)
+    scheduler.start()
+    try:
+        asyncio.run(run_shard_bots(apps, load, index * len(LOAD_FIELDS), metrics_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.shutdown()
+        close_apps(apps)
+
+class ShardLauncher(object):
+    def __init__(self, groups, quota, bans, metrics_port=0, context=None):
+        self.__context = context or multiprocessing.get_context('spawn')
+        self.__groups = groups
+        self.__quota = quota
+        self.__bans = bans
+        self.__metrics_port = metrics_port
+        self.__load = self.__context.RawArray(ctypes.c_double, len(groups) * len(LOAD_FIELDS))
+        self.__processes = [None] * len(groups)
+        self.__started = [0.0] * len(groups)
+        self.__attempts = [0] * len(groups)
+        self.__restart_at = [0.0] * len(groups)
+        self.__last_report = None
+
+    def start(self, index):
+        width = len(LOAD_FIELDS)
+        self.__load[index * width: (index + 1) * width] = [0.0] * width
+        metrics_port = self.__metrics_port + index if self.__metrics_port else 0
+        process = self.__context.Process(target=run_shard, name='shard-%d' % index,
+            args=(index, self.__groups[index], self.__quota, self.__bans, self.__load, metrics_port))
+        process.start()
+        self.__processes[index] = process
+        self.__started[index] = time.monotonic()
+        self.__restart_at[index] = 0.0
+        logger.info('Shard %d started with pid %d ...', index, process.pid)
+
+    def start_all(self):
+        for index in range(0, len(self.__groups)):
+            self.start(index)
+
+    def check(self):
+        # a crashed shard is restarted with the same backoff as a crashed bot
+        now = time.monotonic()
+        for index, process in enumerate(self.__processes):
+            if process.is_alive():
+                continue
+            if self.__restart_at[index] == 0.0:
+                if now - self.__started[index] > HEALTHY_AFTER:
+                    self.__attempts[index] = 0
+                delay = get_backoff(self.__attempts[index])
+                self.__attempts[index] += 1
+                self.__restart_at[index] = now + delay
+                logger.warning('Shard %d exited with code %s, restarting in %.3f seconds ...', index, process.exitcode, delay)
+            elif now >= self.__restart_at[index]:
+                self.start(index)
+
+    def snapshot(self):
+        width = len(LOAD_FIELDS)
+        return [dict(zip(LOAD_FIELDS, self.__load[index * width: (index + 1) * width])) for index in range(0, len(self.__groups))]
+
+    def report(self):
+        now = time.monotonic()
+        current = self.snapshot()
+        if self.__last_report is not None:
+            elapsed, previous = now - self.__last_report[0], self.__last_report[1]
+            for index, (load, last) in enumerate(zip(current, previous)):
+                logger.info('Shard %d: %d bots, cpu %.1f%%, %.1f frames/s in, %.1f frames/s out, %d games finished ...', index, load['bots'],
+                    get_delta(load['cpu'], last['cpu']) / elapsed * 100, get_delta(load['frames_received'], last['frames_received']) / elapsed,
+                    get_delta(load['frames_sent'], last['frames_sent']) / elapsed, load['games_finished'])
+        self.__last_report = (now, current)
+
+    def stop(self, timeout=10.0):
+        # a terminated shard saves the state of its bots before it exits
+        for process in self.__processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.__processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many bots sharded across worker processes.')
+    parser.add_argument('configs', nargs='*', default=['account_config'], help='account configuration modules')
+    parser.add_argument('--shards', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--metrics-port', type=int, default=0, help='serve Prometheus metrics of shard i on this port + i')
+    parser.add_argument('--quota-path', default='', help='keep the shared quota table in this file')
+    parser.add_argument('--ban-path', default='ban.txt')
+    parser.add_argument('--report-interval', type=float, default=60.0, help='seconds between per-shard load reports')
+    args = parser.parse_args(sys.argv[1:])
+
+    # locks of the shared state must come from the same context as the workers
+    context = multiprocessing.get_context('spawn')
+    quota = SharedQuotaTable(args.quota_path, context=context)
+    bans = SharedBanSet(context=context)
+    ban_store = BanStore(args.ban_path)
+    bans.update(ban_store.users)
+    launcher = ShardLauncher(partition(args.configs, max(1, args.shards)), quota, bans, args.metrics_port, context)
+    launcher.start_all()
+
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(func=quota.save, trigger='cron', hour='*', misfire_grace_time=30)
+    scheduler.start()
+    logger.info('Scheduler has been activated ...')
+
+    banned_users = ban_store.users
+    next_report = time.monotonic() + args.report_interval
+    launcher.report()
+    try:
+        while True:
+            time.sleep(1.0)
+            # the ban file is watched here only, the shards read the shared copy
+            if ban_store.users is not banned_users:
+                banned_users = ban_store.users
+                bans.update(banned_users)
+            launcher.check()
+            if time.monotonic() >= next_report:
+                launcher.report()
+                next_report += args.report_interval
+    except KeyboardInterrupt:
+        pass
+
+    logger.info('Stopping shards ...')
+    launcher.stop()
+    scheduler.shutdown()
+    logger.info('Scheduler has been deactivated ...')
+    quota.save()
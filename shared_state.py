@@ -0,0 +1,210 @@
+from history import hash_uid
+from log import logger
+import bisect
+import ctypes
+import json
+import multiprocessing
+import os
+import time
+
+EMPTY, DELETED = 0, 1
+
+def get_key(uid):
+    # uids are stored as 64-bit hashes, the two smallest values mark empty and deleted slots
+    key = hash_uid(uid)
+    return key if key > DELETED else key + 2
+
+class SharedQuotaTable(object):
+    # the QuotaStore interface on an open addressing table in shared memory, usable from every shard
+    def __init__(self, path='', capacity=65536, idle_hours=24, context=multiprocessing):
+        self.__path = path
+        self.__owner = os.getpid()
+        self.__idle_seconds = idle_hours * 3600
+        self.__capacity = 1 << max(4, (capacity - 1).bit_length())
+        self.__lock = context.Lock()
+        self.__keys = context.RawArray(ctypes.c_uint64, self.__capacity)
+        self.__original = context.RawArray(ctypes.c_int32, self.__capacity)
+        self.__left = context.RawArray(ctypes.c_int32, self.__capacity)
+        self.__epochs = context.RawArray(ctypes.c_int64, self.__capacity)
+        self.__last_seen = context.RawArray(ctypes.c_double, self.__capacity)
+        self.__state = context.RawArray(ctypes.c_int64, 3) # generation, number of entries, number of deleted slots
+        if path and os.path.exists(path):
+            self.load()
+
+    def __epoch(self):
+        return int(time.time() // 3600) + self.__state[0]
+
+    def __find(self, key):
+        # returns the slot of the key, or -1 with the first free slot found on the way as the second value
+        mask = self.__capacity - 1
+        index = key & mask
+        free = -1
+        for probe in range(0, self.__capacity):
+            slot_key = self.__keys[index]
+            if slot_key == key:
+                return index, free
+            if slot_key == EMPTY:
+                return -1, index if free < 0 else free
+            if slot_key == DELETED and free < 0:
+                free = index
+            index = (index + 1) & mask
+        return -1, free
+
+    def __lookup(self, uid):
+        index, free = self.__find(get_key(uid))
+        if index < 0:
+            raise KeyError(uid)
+        epoch = self.__epoch()
+        if self.__epochs[index] != epoch:
+            self.__left[index] = self.__original[index]
+            self.__epochs[index] = epoch
+        self.__last_seen[index] = time.time()
+        return index
+
+    def __delete(self, index):
+        self.__keys[index] = DELETED
+        self.__state[1] -= 1
+        self.__state[2] += 1
+
+    def __insert(self, index, key):
+        if self.__keys[index] == DELETED:
+            self.__state[2] -= 1
+        self.__keys[index] = key
+        self.__state[1] += 1
+
+    def __compact(self):
+        # deleted slots lengthen every probe as much as live ones, so the live entries are rehashed into a clean table
+        entries = [(self.__keys[index], self.__original[index], self.__left[index], self.__epochs[index], self.__last_seen[index])
+            for index in range(0, self.__capacity) if self.__keys[index] > DELETED]
+        ctypes.memset(self.__keys, 0, ctypes.sizeof(self.__keys))
+        self.__state[1] = 0
+        self.__state[2] = 0
+        for key, original, left, epoch, last_seen in entries:
+            index = self.__find(key)[1]
+            self.__insert(index, key)
+            self.__original[index] = original
+            self.__left[index] = left
+            self.__epochs[index] = epoch
+            self.__last_seen[index] = last_seen
+
+    def __contains__(self, uid):
+        with self.__lock:
+            return self.__find(get_key(uid))[0] >= 0
+
+    def __len__(self):
+        return self.__state[1]
+
+    def register(self, uid, original):
+        key = get_key(uid)
+        with self.__lock:
+            index, free = self.__find(key)
+            if index >= 0:
+                return
+            if self.__state[1] * 4 >= self.__capacity * 3:
+                # a table that is too full probes too long, the least recently seen entry makes room
+                oldest = min((slot for slot in range(0, self.__capacity) if self.__keys[slot] > DELETED), key=lambda slot: self.__last_seen[slot])
+                self.__delete(oldest)
+                logger.warning('The shared quota table is full, evicting the least recently seen user ...')
+            if (self.__state[1] + self.__state[2]) * 8 >= self.__capacity * 7:
+                logger.info('Compacting %d deleted slots of the shared quota table ...', self.__state[2])
+                self.__compact()
+            index, free = self.__find(key)
+            self.__insert(free, key)
+            self.__original[free] = original
+            self.__left[free] = original
+            self.__epochs[free] = self.__epoch()
+            self.__last_seen[free] = time.time()
+
+    def left(self, uid):
+        with self.__lock:
+            return self.__left[self.__lookup(uid)]
+
+    def consume(self, uid):
+        with self.__lock:
+            index = self.__lookup(uid)
+            self.__left[index] -= 1
+            return self.__left[index]
+
+    def reset(self):
+        with self.__lock:
+            self.__state[0] += 1
+
+    def evict_idle(self):
+        evicted = 0
+        with self.__lock:
+            deadline = time.time() - self.__idle_seconds
+            for index in range(0, self.__capacity):
+                if self.__keys[index] > DELETED and self.__last_seen[index] < deadline:
+                    self.__delete(index)
+                    evicted += 1
+        return evicted
+
+    def snapshot(self):
+        with self.__lock:
+            return {
+                'generation': self.__state[0],
+                'hashed': True,
+                'entries': {str(self.__keys[index]): [self.__original[index], self.__left[index], self.__epochs[index], self.__last_seen[index]]
+                    for index in range(0, self.__capacity) if self.__keys[index] > DELETED},
+            }
+
+    def load(self):
+        with open(self.__path, 'r') as f:
+            snapshot = json.load(f)
+        # a file saved by a QuotaStore is keyed by the uids themselves
+        hashed = snapshot.get('hashed', False)
+        with self.__lock:
+            self.__state[0] = snapshot['generation']
+            for uid, (original, left, epoch, last_seen) in snapshot['entries'].items():
+                key = int(uid) if hashed else get_key(uid)
+                index, free = self.__find(key)
+                if index < 0 and free >= 0:
+                    index = free
+                    self.__insert(index, key)
+                if index >= 0:
+                    self.__original[index] = original
+                    self.__left[index] = left
+                    self.__epochs[index] = epoch
+                    self.__last_seen[index] = last_seen
+        logger.info('Loaded %d users into the shared quota table ...', len(self))
+
+    def save(self):
+        # only the launcher that created the table evicts and writes it, the shards share its memory
+        if os.getpid() != self.__owner:
+            return
+        evicted = self.evict_idle()
+        if not self.__path:
+            logger.info('%d idle users evicted from the shared quota table ...', evicted)
+            return
+        snapshot = self.snapshot()
+        temp_path = self.__path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(temp_path, self.__path)
+        logger.info('Saved %d users from the shared quota table, %d idle users evicted ...', len(snapshot['entries']), evicted)
+
+class SharedBanSet(object):
+    # a sorted array of uid hashes, written by the launcher and searched by the shards
+    def __init__(self, capacity=65536, context=multiprocessing):
+        self.__capacity = capacity
+        self.__lock = context.Lock()
+        self.__keys = context.RawArray(ctypes.c_uint64, capacity)
+        self.__count = context.RawValue(ctypes.c_int64, 0)
+
+    def __contains__(self, uid):
+        key = get_key(uid)
+        with self.__lock:
+            index = bisect.bisect_left(self.__keys, key, 0, self.__count.value)
+            return index < self.__count.value and self.__keys[index] == key
+
+    def __len__(self):
+        return self.__count.value
+
+    def update(self, uids):
+        keys = sorted({get_key(uid) for uid in uids})
+        if len(keys) > self.__capacity:
+            logger.error('The ban list has %d users, only %d of them fit into shared memory ...', len(keys), self.__capacity)
+            keys = keys[0: self.__capacity]
+        with self.__lock:
+            self.__keys[0: len(keys)] = keys
+            self.__count.value = len(keys)
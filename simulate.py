@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from controller import DEC_MAX, DEC_MIN, INC_MAX, INC_MIN, update_level
+from difficulty import estimate_bvs, estimate_levels, get_coefficient
+import argparse
+import itertools
+import json
+import sys
+import time
+import numpy as np
+
+# (row, column, mines) and the mean and spread of the bv of random boards of that size
+SIZES = {
+    'beg': ((8, 8, 10), 17.0, 5.0),
+    'int': ((16, 16, 40), 55.0, 12.0),
+    'exp': ((16, 30, 99), 130.0, 20.0),
+}
+SWEEP_PARAMETERS = ('inc_min', 'inc_max', 'dec_min', 'dec_max', 'inc_init', 'dec_init')
+
+def make_settings(**values):
+    # the cartesian product of the given values, one column per parameter
+    grid = np.array(list(itertools.product(*(values[name] for name in SWEEP_PARAMETERS))), dtype=np.float64)
+    return {name: grid[:, index] for index, name in enumerate(SWEEP_PARAMETERS)}
+
+def simulate(settings, players=200, games=100, size='int', skill_mean=2.0, skill_sigma=0.6, noise=0.15,
+        initial_level=2.0, min_level=0.5, max_level=8.0, tolerance=0.25, seed=0):
+    # every setting plays the same opponents on the same boards, the arrays are (settings, players)
+    rng = np.random.default_rng(seed)
+    (row, column, mines), bv_mean, bv_std = SIZES[size]
+    coefficient = get_coefficient(row, column, mines)
+    count = len(settings['inc_min'])
+    column_of = lambda name: settings[name][:, None]
+
+    skills = np.clip(np.exp(rng.normal(np.log(skill_mean), skill_sigma, players)), min_level, max_level)[None, :]
+    levels = np.full((count, players), initial_level)
+    inc_factors = np.broadcast_to(column_of('inc_init'), (count, players)).copy()
+    dec_factors = np.broadcast_to(column_of('dec_init'), (count, players)).copy()
+    streak = np.zeros((count, players))
+    late_wins = np.zeros((count, players))
+    late_moves = np.zeros((count, players))
+    late_errors = np.zeros((count, players))
+    late_start = games // 2
+
+    for game in range(0, games):
+        bvs = np.maximum(np.round(rng.normal(bv_mean, bv_std, players)), 1.0)[None, :]
+        player_times = bvs / estimate_bvs(skills, coefficient, bvs) * np.exp(rng.normal(0.0, noise, players))[None, :]
+        bot_times = bvs / estimate_bvs(levels, coefficient, bvs)
+        won = bot_times < player_times
+        # a beaten opponent has solved the part of the board it would have reached at the bot's finish time
+        solved_bvs = np.where(won, np.maximum(np.floor(bvs * bot_times / player_times), 1.0), bvs)
+        est_levels = estimate_levels(coefficient, np.where(won, bot_times, player_times), solved_bvs, bvs)
+
+        previous = levels
+        levels, inc_factors, dec_factors = update_level(won, levels, est_levels, inc_factors, dec_factors, min_level, max_level,
+            column_of('inc_min'), column_of('inc_max'), column_of('dec_min'), column_of('dec_max'))
+        errors = np.log(levels / skills)
+        streak = (streak + 1) * (np.abs(errors) < np.log1p(tolerance))
+        if game >= late_start:
+            late_wins += won
+            late_moves += np.abs(levels - previous) / skills
+            late_errors += errors ** 2
+
+    late_games = games - late_start
+    convergence = games - streak # games until the level stays within the tolerance of the skill
+    win_rates = late_wins / late_games
+    result = {name: settings[name] for name in SWEEP_PARAMETERS}
+    result['converged'] = (streak > 0).mean(axis=1)
+    result['convergence_games'] = convergence.mean(axis=1)
+    result['oscillation'] = (late_moves / late_games).mean(axis=1)
+    result['error'] = np.sqrt(late_errors / late_games).mean(axis=1)
+    result['win_rate'] = win_rates.mean(axis=1)
+    result['unfairness'] = np.abs(win_rates - 0.5).mean(axis=1)
+    return result
+
+def parse_values(text):
+    return [float(value) for value in text.split(',')]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate the level controller against many opponents for a sweep of its parameters.')
+    parser.add_argument('--inc-min', type=parse_values, default=[INC_MIN])
+    parser.add_argument('--inc-max', type=parse_values, default=[INC_MAX])
+    parser.add_argument('--dec-min', type=parse_values, default=[DEC_MIN])
+    parser.add_argument('--dec-max', type=parse_values, default=[DEC_MAX])
+    parser.add_argument('--inc-init', type=parse_values, default=[0.24])
+    parser.add_argument('--dec-init', type=parse_values, default=[0.08])
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--size', default='int', choices=list(SIZES.keys()))
+    parser.add_argument('--skill-mean', type=float, default=2.0)
+    parser.add_argument('--skill-sigma', type=float, default=0.6, help='spread of log(skill) across opponents')
+    parser.add_argument('--noise', type=float, default=0.15, help='spread of log(time) of an opponent across games')
+    parser.add_argument('--min-level', type=float, default=0.5)
+    parser.add_argument('--max-level', type=float, default=8.0)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative error at which a level counts as converged')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=10, help='settings to print, ordered by unfairness and oscillation')
+    parser.add_argument('--output', default='', help='write the results of every setting as JSON to this file')
+    args = parser.parse_args(argv)
+
+    settings = make_settings(inc_min=args.inc_min, inc_max=args.inc_max, dec_min=args.dec_min, dec_max=args.dec_max,
+        inc_init=args.inc_init, dec_init=args.dec_init)
+    started = time.perf_counter()
+    result = simulate(settings, args.players, args.games, args.size, args.skill_mean, args.skill_sigma, args.noise,
+        min_level=args.min_level, max_level=args.max_level, tolerance=args.tolerance, seed=args.seed)
+    elapsed = time.perf_counter() - started
+
+    count = len(result['inc_min'])
+    print('%d settings x %d players x %d games simulated in %.3f seconds' % (count, args.players, args.games, elapsed))
+    order = np.lexsort((result['oscillation'], result['unfairness']))
+    print('%8s %8s %8s %8s %8s %8s | %9s %11s %11s %8s %8s %10s' % (SWEEP_PARAMETERS + ('converged', 'convergence', 'oscillation', 'error', 'win_rate', 'unfairness')))
+    for index in order[0: args.top]:
+        print('%8.3f %8.3f %8.3f %8.3f %8.3f %8.3f | %9.3f %11.1f %11.4f %8.4f %8.3f %10.4f' % tuple(result[name][index] for name in
+            SWEEP_PARAMETERS + ('converged', 'convergence_games', 'oscillation', 'error', 'win_rate', 'unfairness')))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({name: values.tolist() for name, values in result.items()}, f, indent=2)
+    return result
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,27 @@
+from collections import deque
+
+class LatencyStats(object):
+    def __init__(self, window=2048):
+        self.calls = 0
+        self.total = 0.0
+        self.__samples = deque(maxlen=window)
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        self.__samples.append(elapsed)
+
+    def percentile(self, ratio):
+        # percentiles are taken over the most recent samples only
+        if not self.__samples:
+            return 0.0
+        ordered = sorted(self.__samples)
+        return ordered[min(len(ordered) - 1, int(ratio * len(ordered)))]
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'total': self.total,
+            'p50': self.percentile(0.50),
+            'p99': self.percentile(0.99),
+        }
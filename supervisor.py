@@ -0,0 +1,73 @@
+from log import logger
+from metrics import LoopLagMonitor, MetricsRegistry, start_metrics_server
+from aiohttp.client_exceptions import ClientConnectorError
+import aiohttp
+import asyncio
+import random
+import traceback
+
+RETRY_BASE = 0.2
+RETRY_MAX = 300.0
+HEALTHY_AFTER = 60.0
+START_STAGGER = 0.5
+
+def get_backoff(attempt):
+    # exponential backoff with jitter, so a fleet does not reconnect in lockstep
+    return min(RETRY_MAX, RETRY_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def make_session():
+    # websockets hold their connections for the whole session, so the pool must not be capped
+    connector = aiohttp.TCPConnector(limit=0, use_dns_cache=True, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector)
+
+async def supervise(app, session, start_delay=0):
+    await asyncio.sleep(start_delay)
+    loop = asyncio.get_running_loop()
+    bot_restart_counter = 1
+    attempt = 0
+    while True:
+        logger.info('Bot [%s] running count: %d', app.uid, bot_restart_counter)
+        started = loop.time()
+
+        try:
+            await app.run(session, resume=bot_restart_counter > 1)
+        except ClientConnectorError:
+            logger.warning('Bot [%s]: the connection is down, please check your connection ...', app.uid)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.critical('Bot [%s]: %s', app.uid, traceback.format_exc())
+
+        if loop.time() - started > HEALTHY_AFTER:
+            attempt = 0
+        restart_interval = get_backoff(attempt)
+        attempt += 1
+        bot_restart_counter += 1
+
+        logger.info('Restarting bot [%s] in %.3f seconds ...', app.uid, restart_interval)
+        await asyncio.sleep(restart_interval)
+
+async def run_bots(apps, metrics_port=0, metrics_host='127.0.0.1'):
+    runner = None
+    tasks = []
+    if metrics_port:
+        registry = MetricsRegistry()
+        monitor = LoopLagMonitor()
+        registry.register(monitor.collect)
+        for app in apps:
+            registry.register(app.collect)
+        # pools and frame caches are shared by the bots of a process, so they are exported once and not per uid
+        for offloader in {id(app.offloader): app.offloader for app in apps}.values():
+            registry.register(offloader.collect)
+        for frame_cache in {id(app.frame_cache): app.frame_cache for app in apps}.values():
+            registry.register(frame_cache.collect)
+        tasks.append(monitor.run())
+        runner = await start_metrics_server(registry, metrics_host, metrics_port)
+
+    try:
+        async with make_session() as session:
+            tasks.extend(supervise(app, session, index * START_STAGGER) for index, app in enumerate(apps))
+            await asyncio.gather(*tasks)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
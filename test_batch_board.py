@@ -0,0 +1,28 @@
+from batch_board import encode_boards, get_batch_board_result, get_board_results
+from benchmark import generate_cells
+from board import get_board, get_board_result
+import random
+import pytest
+
+SIZES = [(8, 8, 10), (16, 16, 40), (16, 30, 99), (30, 16, 99), (24, 9, 50), (50, 50, 500), (5, 7, 0), (5, 7, 35), (1, 12, 3), (12, 1, 3)]
+
+def reference(cells):
+    return get_board_result(get_board(cells.split('-')[0: -1]))
+
+@pytest.mark.parametrize('size', SIZES)
+def test_batch_matches_reference(size):
+    rng = random.Random(sum(size))
+    cells_list = [generate_cells(*size, rng) for index in range(0, 100)]
+    assert get_board_results(cells_list) == [reference(cells) for cells in cells_list]
+
+def test_single_board_batch():
+    cells = generate_cells(16, 30, 99, random.Random(7))
+    batch = get_batch_board_result(encode_boards([cells]))
+    expected = reference(cells)
+    assert (int(batch['op'][0]), int(batch['bv'][0]), int(batch['is'][0])) == (expected['op'], expected['bv'], expected['is'])
+
+@pytest.mark.parametrize('other', [(4, 16, 10), (16, 4, 10), (8, 9, 10)])
+def test_boards_of_another_size_are_refused(other):
+    rng = random.Random(3)
+    with pytest.raises(ValueError):
+        encode_boards([generate_cells(8, 8, 10, rng), generate_cells(*other, rng)])
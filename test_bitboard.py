@@ -0,0 +1,14 @@
+from benchmark import generate_cells
+from bitboard import get_cells_result
+from board import get_board, get_board_result
+import random
+import pytest
+
+SIZES = [(8, 8, 10), (16, 16, 40), (16, 30, 99), (30, 16, 99), (50, 50, 500), (5, 7, 0), (5, 7, 35), (1, 12, 3), (12, 1, 3)]
+
+@pytest.mark.parametrize('size', SIZES)
+def test_bitboard_matches_reference(size):
+    rng = random.Random(sum(size))
+    for index in range(0, 50):
+        cells = generate_cells(*size, rng)
+        assert get_cells_result(cells) == get_board_result(get_board(cells.split('-')[0: -1]))
@@ -0,0 +1,152 @@
+from autopvp import AutoPVPApp
+from benchmark import generate_cells
+from controller import is_rated, update_level
+from difficulty import get_est_level
+from history import GameHistoryReader
+from quota import QuotaStore
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import types
+import pytest
+
+KEY = '0123456789abcdef'
+SALT = 'salt'
+BOT = '1000'
+OPPONENT = '55'
+
+def encode(message):
+    # the framing of the server: md5 of the hex ciphertext and the salt, followed by the ciphertext
+    encrypted = AES.new(KEY.encode(), AES.MODE_ECB).encrypt(pad(json.dumps(message).encode(), AES.block_size)).hex().upper()
+    return hashlib.md5((encrypted + SALT).encode()).hexdigest() + encrypted
+
+class FakeSocket(object):
+    def __init__(self):
+        self.sent = []
+
+    async def send_str(self, data):
+        self.sent.append(data)
+
+class Clock(object):
+    # wall clock of the bot, moved forward by the tests, the event loop keeps its own monotonic time
+    def __init__(self):
+        self.offset = 0.0
+        self.real = time.time
+
+    def __call__(self):
+        return self.real() + self.offset
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+def make_app(tmp_path, **options):
+    config = types.SimpleNamespace(uid=BOT, token='', host='127.0.0.1:8765', version='', salt=SALT, key=KEY,
+        max_level=8.0, min_level=0.5, inc_factor=0.24, dec_factor=0.08, normal_max=10, vip_max=20,
+        level_memory_path=str(tmp_path / 'level_memory.json'), **options)
+    app = AutoPVPApp(config, quota=QuotaStore(), bans=set())
+    app.attach(FakeSocket())
+    return app
+
+def get_level(app):
+    return next(value for name, kind, labels, value in app.collect() if name == 'autopvp_level')
+
+def room(gaming):
+    return {'userIdList': [BOT, OPPONENT], 'expired': False, 'gaming': gaming, 'users': [{'pvp': {'uid': OPPONENT}}], 'coin': 0,
+        'password': '', 'minesweeperAutoOpen': True, 'minesweeperFlagForbidden': False, 'round': 1, 'maxNumber': 2}
+
+async def feed(app, message):
+    assert await app.feed(encode(message))
+
+async def enter(app):
+    await feed(app, {'url': 'pvp/enter'})
+    await feed(app, {'url': 'pvp/room/enter/event', 'user': {'pvp': {'uid': OPPONENT}, 'user': {'timingLevel': 3, 'vip': False}}})
+    await feed(app, {'url': 'pvp/room/update', 'room': room(False)})
+
+async def start(app):
+    # the board arrives with a 6 second preparation before the game starts
+    await feed(app, {'url': 'pvp/room/update', 'room': room(True)})
+    await feed(app, {'url': 'pvp/minesweeper/info', 'cells': [generate_cells(8, 8, 10, random.Random(1))]})
+
+async def win(app, uid):
+    await feed(app, {'url': 'pvp/minesweeper/win', 'users': [{'pvp': {'uid': uid}}]})
+
+def test_is_rated():
+    assert is_rated(12.5, 3)
+    assert not is_rated(0.0, 3)
+    assert not is_rated(-6.0, 3)
+    assert not is_rated(12.5, 0)
+
+def test_negative_time_gives_a_complex_estimate():
+    # the reason for is_rated, the controller must never see this estimate
+    assert isinstance(get_est_level((8, 8, 10), -6.0, 3, 20), complex)
+
+def test_update_level_stays_real():
+    level, inc_factor, dec_factor = update_level(True, 2.0, get_est_level((8, 8, 10), 12.5, 3, 20), 0.24, 0.08, 0.5, 8.0)
+    assert all(isinstance(float(value), float) for value in (level, inc_factor, dec_factor))
+
+@pytest.mark.parametrize('winner', [BOT, OPPONENT])
+def test_game_ended_during_preparation(tmp_path, clock, winner):
+    async def play():
+        app = make_app(tmp_path)
+        await enter(app)
+        level = get_level(app)
+        await start(app)
+        await win(app, winner)
+        return level, get_level(app)
+    level_before, level_after = asyncio.run(play())
+    assert level_after == level_before
+
+def test_bot_win_after_the_opponent_left(tmp_path, clock):
+    # the pacer never finishes, so the bot wins without a finish time of its own
+    async def play():
+        app = make_app(tmp_path)
+        await enter(app)
+        await start(app)
+        clock.offset += 20.0
+        await feed(app, {'url': 'pvp/minesweeper/progress', 'uid': OPPONENT, 'bv': 5})
+        await feed(app, {'url': 'pvp/room/user/exit', 'user': {'pvp': {'uid': OPPONENT}}})
+        await win(app, BOT)
+        return get_level(app)
+    level = asyncio.run(play())
+    assert isinstance(level, float)
+    assert 0.5 <= level <= 8.0
+
+def test_opponent_win_is_rated(tmp_path, clock):
+    async def play():
+        app = make_app(tmp_path)
+        await enter(app)
+        level = get_level(app)
+        await start(app)
+        clock.offset += 30.0
+        await win(app, OPPONENT)
+        return level, get_level(app)
+    level_before, level_after = asyncio.run(play())
+    assert level_after != level_before
+    assert isinstance(level_after, float)
+
+def test_history_with_level_held(tmp_path, clock):
+    path = str(tmp_path / 'history.bin')
+    async def play():
+        app = make_app(tmp_path, history_path=path)
+        await enter(app)
+        await feed(app, {'url': 'pvp/room/message', 'msg': {'user': {'uid': OPPONENT}, 'message': 'lv holdon'}})
+        await start(app)
+        clock.offset += 30.0
+        await win(app, OPPONENT)
+        await start(app)
+        await win(app, OPPONENT)
+        app.close()
+    asyncio.run(play())
+    records = GameHistoryReader(path).records
+    assert len(records) == 2
+    assert 23.0 < records['finish_time'][0] < 60.0
+    assert math.isnan(records['finish_time'][1])
+    assert records['level_after'][0] == records['level_before'][0]
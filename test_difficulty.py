@@ -0,0 +1,13 @@
+from difficulty import COEFFICIENTS, get_coefficient, interpolate_coefficients
+import pytest
+
+@pytest.mark.parametrize('size', list(COEFFICIENTS.keys()))
+def test_plane_passes_through_standard_boards(size):
+    assert float(interpolate_coefficients(*size)) == pytest.approx(COEFFICIENTS[size])
+
+def test_density_changes_the_coefficient():
+    assert get_coefficient(30, 30, 99) != pytest.approx(get_coefficient(16, 30, 99))
+    assert get_coefficient(24, 24, 99) != pytest.approx(get_coefficient(30, 30, 99))
+
+def test_coefficient_grows_with_mines():
+    assert get_coefficient(8, 8, 10) < get_coefficient(16, 16, 40) < get_coefficient(16, 30, 99) < get_coefficient(50, 50, 500)
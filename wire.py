@@ -0,0 +1,52 @@
+import threading
+import zlib
+
+class WireStats(object):
+    def __init__(self, sample=16):
+        # compressed sizes are estimated from every N-th frame of a url, as aiohttp does not expose them
+        self.__sample = max(1, sample)
+        self.__wbits = 0
+        self.__lock = threading.Lock()
+        self.__entries = {}
+
+    def set_compress(self, wbits):
+        with self.__lock:
+            self.__wbits = wbits
+
+    def record(self, direction, url, frame, decrypted_size):
+        key = (direction, url or 'other')
+        raw_size = len(frame)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                # [frames, raw bytes, decrypted bytes, sampled raw bytes, sampled compressed bytes]
+                entry = self.__entries[key] = [0, 0, 0, 0, 0]
+            entry[0] += 1
+            entry[1] += raw_size
+            entry[2] += decrypted_size
+            sampled = (entry[0] - 1) % self.__sample == 0
+            wbits = self.__wbits
+        if not sampled:
+            return
+        compressed_size = raw_size
+        if wbits:
+            # a single permessage-deflate message, without the shared window of the previous ones
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -wbits)
+            compressed_size = len(compressor.compress(frame.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+        with self.__lock:
+            entry[3] += raw_size
+            entry[4] += compressed_size
+
+    def snapshot(self):
+        with self.__lock:
+            return {key: list(entry) for key, entry in self.__entries.items()}
+
+    def collect(self, labels):
+        yield 'autopvp_ws_compress_wbits', 'gauge', labels, self.__wbits
+        for (direction, url), (frames, raw, decrypted, sampled_raw, sampled_compressed) in self.snapshot().items():
+            entry_labels = dict(labels, direction=direction, url=url)
+            yield 'autopvp_wire_frames_total', 'counter', entry_labels, frames
+            yield 'autopvp_wire_raw_bytes_total', 'counter', entry_labels, raw
+            yield 'autopvp_wire_decrypted_bytes_total', 'counter', entry_labels, decrypted
+            ratio = sampled_compressed / sampled_raw if sampled_raw else 1.0
+            yield 'autopvp_wire_compressed_bytes_total', 'counter', entry_labels, round(raw * ratio)